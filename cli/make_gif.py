@@ -11,7 +11,6 @@ def create_gif(frames_folder, output_gif_name, duration=100):
         output_gif_name (str): 输出 GIF 的文件名。
         duration (int): 每帧的持续时间（毫秒）。数值越小速度越快。
     """
-    images = []
     # 获取文件夹内所有 png 文件，并排序确保顺序正确
     filenames = sorted([f for f in os.listdir(frames_folder) if f.endswith(".png")])
     
@@ -21,9 +20,16 @@ def create_gif(frames_folder, output_gif_name, duration=100):
 
     print(f"找到 {len(filenames)} 帧，开始合成 GIF...")
 
-    for filename in filenames:
-        filepath = os.path.join(frames_folder, filename)
-        images.append(Image.open(filepath))
+    def iter_images():
+        # 逐帧解码后立即关闭文件，帧数多时不会耗尽文件句柄
+        for filename in filenames:
+            with open(os.path.join(frames_folder, filename), 'rb') as fh:
+                img = Image.open(fh)
+                img.load()
+            yield img
+
+    images = iter_images()
+    first = next(images)
 
     # 保存为 GIF
     # save_all=True: 保存所有帧
@@ -31,13 +37,14 @@ def create_gif(frames_folder, output_gif_name, duration=100):
     # duration: 每帧持续毫秒数
     # loop=0: 无限循环
     # transparency=0 和 disposal=2 用于处理透明背景的叠加问题，让上一帧清除干净
-    images[0].save(
+    first.save(
         output_gif_name,
         save_all=True,
-        append_images=images[1:],
+        append_images=images,
         duration=duration,
         loop=0, 
-        disposal=2 
+        disposal=2,
+        optimize=False
     )
     print(f"GIF 合成成功！已保存为: {output_gif_name}")
 
@@ -8,6 +8,12 @@ import os
 import sys
 import glob
 
+# 图像处理相关函数，依赖检查通过后由 load_tools() 统一加载一次
+analyze_spritesheet = None
+print_analysis_result = None
+slice_spritesheet = None
+create_gif = None
+
 
 def clear_screen():
     """清屏"""
@@ -31,20 +37,32 @@ def check_dependencies():
     """检查依赖是否已安装"""
     try:
         from PIL import Image
+        import numpy
         return True
     except ImportError:
         return False
 
 
+def load_tools():
+    """依赖确认后加载切片/检测/合成模块（只加载一次，后续调用直接复用）"""
+    global analyze_spritesheet, print_analysis_result, slice_spritesheet, create_gif
+    if analyze_spritesheet is not None:
+        return
+    
+    from auto_detect import analyze_spritesheet, print_analysis_result
+    from slice_spritesheet import slice_spritesheet
+    from make_gif import create_gif
+
+
 def install_dependencies():
     """安装依赖"""
     print("\n📦 正在安装必要的依赖...")
     
     # 尝试多种安装方式
     commands = [
-        [sys.executable, "-m", "pip", "install", "Pillow", "-q"],
-        ["pip3", "install", "Pillow", "-q"],
-        ["pip", "install", "Pillow", "-q"],
+        [sys.executable, "-m", "pip", "install", "Pillow", "numpy", "-q"],
+        ["pip3", "install", "Pillow", "numpy", "-q"],
+        ["pip", "install", "Pillow", "numpy", "-q"],
     ]
     
     import subprocess
@@ -57,7 +75,7 @@ def install_dependencies():
         except Exception:
             continue
     
-    print("❌ 自动安装失败，请手动运行: pip install Pillow")
+    print("❌ 自动安装失败，请手动运行: pip install Pillow numpy")
     return False
 
 
@@ -118,8 +136,6 @@ def get_output_name(input_image):
 
 def run_auto_detection(image_path):
     """运行自动检测"""
-    from auto_detect import analyze_spritesheet, print_analysis_result
-    
     print("\n🔍 正在自动分析图片结构...")
     result = analyze_spritesheet(image_path)
     print_analysis_result(result)
@@ -129,13 +145,11 @@ def run_auto_detection(image_path):
 
 def run_slice(image_path, output_folder, rows, cols, margin):
     """运行切片"""
-    from slice_spritesheet import slice_spritesheet
     slice_spritesheet(image_path, output_folder, rows, cols, margin)
 
 
 def run_gif_creation(frames_folder, output_gif, duration):
     """运行 GIF 合成"""
-    from make_gif import create_gif
     create_gif(frames_folder, output_gif, duration)
 
 
@@ -171,16 +185,18 @@ def main():
     
     # 检查依赖
     if not check_dependencies():
-        print("⚠️  检测到缺少必要的依赖库 (Pillow)")
+        print("⚠️  检测到缺少必要的依赖库 (Pillow/numpy)")
         if ask_yes_no("是否自动安装"):
             if not install_dependencies():
                 input("\n按回车键退出...")
                 return
         else:
-            print("\n请手动安装依赖后重试: pip install Pillow")
+            print("\n请手动安装依赖后重试: pip install Pillow numpy")
             input("按回车键退出...")
             return
     
+    load_tools()
+    
     # 查找图片
     images = find_images()
     
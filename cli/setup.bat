@@ -39,7 +39,7 @@ echo.
 echo 📦 安装依赖...
 call .venv\Scripts\activate.bat
 python -m pip install --upgrade pip -q
-pip install Pillow -q
+pip install Pillow numpy -q
 echo ✅ 依赖安装完成
 
 echo.
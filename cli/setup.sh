@@ -44,7 +44,7 @@ echo ""
 echo "📦 安装依赖..."
 source .venv/bin/activate
 pip install --upgrade pip -q
-pip install Pillow -q
+pip install Pillow numpy -q
 echo "✅ 依赖安装完成"
 
 echo ""
@@ -4,14 +4,17 @@
 """
 
 from .detector import analyze_spritesheet
-from .slicer import slice_spritesheet, slice_spritesheet_to_frames
-from .gif_maker import create_gif, create_gif_from_frames
+from .slicer import slice_spritesheet, slice_spritesheet_to_frames, slice_spritesheet_iter, save_frames
+from .gif_maker import create_gif, create_gif_from_frames, create_gif_stream
 
 __all__ = [
     'analyze_spritesheet',
     'slice_spritesheet',
     'slice_spritesheet_to_frames',
+    'slice_spritesheet_iter',
+    'save_frames',
     'create_gif',
     'create_gif_from_frames',
+    'create_gif_stream',
 ]
 
@@ -0,0 +1,71 @@
+"""
+检测模块的 numba 编译内核
+
+仅在安装了 numba 时由 detector.py 导入，导入失败时 detector 自动回退到纯 NumPy 实现
+"""
+
+import numpy as np
+from numba import njit
+from typing import Tuple
+
+
+# 不使用 parallel=True：Web 端会在多个线程里并发调用分析，numba 回退到 workqueue
+# 线程层时并发进入并行区域会直接让进程 abort，而并行带来的收益每张图不到 1 毫秒
+@njit(cache=True)
+def project_gray(gray: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """一次扫描灰度图同时计算水平/垂直投影"""
+    height, width = gray.shape
+    h_proj = np.empty(height, dtype=np.float32)
+    col_sums = np.zeros(width, dtype=np.uint32)
+    for y in range(height):
+        row_sum = 0
+        for x in range(width):
+            v = gray[y, x]
+            row_sum += v
+            col_sums[x] += v
+        h_proj[y] = row_sum / width
+    
+    v_proj = np.empty(width, dtype=np.float32)
+    for x in range(width):
+        v_proj[x] = col_sums[x] / height
+    return h_proj, v_proj
+
+
+@njit(cache=True)
+def find_runs(proj: np.ndarray, threshold: float, min_width: int,
+              detect_dark: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """逐点扫描投影，返回连续线段的起点和终点数组"""
+    n = proj.shape[0]
+    starts = np.empty(n, dtype=np.int64)
+    ends = np.empty(n, dtype=np.int64)
+    count = 0
+    in_line = False
+    start = 0
+    for i in range(n):
+        is_line = proj[i] < threshold if detect_dark else proj[i] > threshold
+        if is_line and not in_line:
+            start = i
+            in_line = True
+        elif not is_line and in_line:
+            if i - start >= min_width:
+                starts[count] = start
+                ends[count] = i
+                count += 1
+            in_line = False
+    if in_line and n - start >= min_width:
+        starts[count] = start
+        ends[count] = n
+        count += 1
+    return starts[:count], ends[:count]
+
+
+@njit(cache=True)
+def greedy_filter_edges(candidates: np.ndarray, min_gap: int) -> np.ndarray:
+    """贪心保留与上一个边缘间隔不小于 min_gap 的候选点"""
+    kept = np.empty(candidates.shape[0], dtype=np.int64)
+    count = 0
+    for i in range(candidates.shape[0]):
+        if count == 0 or candidates[i] - kept[count - 1] >= min_gap:
+            kept[count] = candidates[i]
+            count += 1
+    return kept[:count]
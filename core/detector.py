@@ -9,17 +9,37 @@
 4. 均匀分割推测 - 基于常见网格尺寸推测
 """
 
+import os
+import hashlib
+import threading
+import numpy as np
 from PIL import Image, ImageFilter
 from typing import Tuple, List, Union, Optional
-from statistics import mean, median, stdev
 from io import BytesIO
-from collections import Counter
+from collections import OrderedDict
+from functools import partial
 
+try:
+    from ._detector_numba import find_runs, greedy_filter_edges, project_gray
+    HAS_NUMBA = True
+except ImportError:  # numba 为可选依赖，缺失时使用纯 NumPy 实现
+    HAS_NUMBA = False
 
-def detect_grid_lines(projection: List[float], 
+
+# auto 模式下某个策略的置信度达到该值即不再尝试后续策略
+EARLY_EXIT_CONFIDENCE = 0.9
+
+# 投影缓存：图片指纹 -> (水平投影, 垂直投影, 原图尺寸, 缩放系数)
+PROJECTION_CACHE_SIZE = 8
+_projection_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_projection_cache_lock = threading.Lock()
+
+
+def detect_grid_lines(projection: np.ndarray, 
                       threshold_ratio: float = 0.3,
                       min_line_width: int = 1,
-                      detect_dark: bool = True) -> List[Tuple[int, int]]:
+                      detect_dark: bool = True,
+                      proj_mean: Optional[float] = None) -> List[Tuple[int, int]]:
     """
     从投影数据中检测分隔线位置
     
@@ -28,38 +48,61 @@ def detect_grid_lines(projection: List[float],
         threshold_ratio: 阈值比例
         min_line_width: 最小线宽
         detect_dark: True检测暗线，False检测亮线
+        proj_mean: 预先计算的投影均值（多阈值扫描时复用）
     """
-    avg = mean(projection)
+    lines = detect_grid_lines_batch(projection, [threshold_ratio], min_line_width,
+                                    detect_dark, proj_mean)[0]
+    return [tuple(line) for line in lines.tolist()]
+
+
+def detect_grid_lines_batch(projection: np.ndarray,
+                            threshold_ratios: List[float],
+                            min_line_width: int = 1,
+                            detect_dark: bool = True,
+                            proj_mean: Optional[float] = None) -> List[np.ndarray]:
+    """
+    一次性对多个阈值检测分隔线，返回与 threshold_ratios 一一对应的结果
+    
+    所有阈值的掩码通过广播一次生成（N x K），再按列提取连续线段。
+    每个结果为 (N, 2) 的整数数组，每行是一条线的 [start, end)
+    """
+    proj = np.asarray(projection)
+    avg = proj.mean() if proj_mean is None else proj_mean
+    ratios = np.asarray(threshold_ratios, dtype=np.float64)
     
     if detect_dark:
-        threshold = avg * threshold_ratio
-        is_line = lambda val: val < threshold
+        thresholds = avg * ratios
     else:
-        threshold = avg + (255 - avg) * (1 - threshold_ratio)
-        is_line = lambda val: val > threshold
+        thresholds = avg + (255 - avg) * (1 - ratios)
+    
+    if HAS_NUMBA:
+        return [np.column_stack(find_runs(proj, float(threshold), min_line_width, detect_dark))
+                for threshold in thresholds]
     
-    lines = []
-    in_line = False
-    start = 0
+    if detect_dark:
+        is_line = proj[:, None] < thresholds[None, :]
+    else:
+        is_line = proj[:, None] > thresholds[None, :]
     
-    for i, val in enumerate(projection):
-        if is_line(val) and not in_line:
-            start = i
-            in_line = True
-        elif not is_line(val) and in_line:
-            if i - start >= min_line_width:
-                lines.append((start, i))
-            in_line = False
+    # 两端补 False，用 diff 找出连续线段的起点(+1)和终点(-1)
+    padded = np.zeros((proj.size + 2, ratios.size), dtype=np.int8)
+    padded[1:-1] = is_line
+    changes = np.diff(padded, axis=0)
     
-    if in_line and len(projection) - start >= min_line_width:
-        lines.append((start, len(projection)))
+    results = []
+    for k in range(ratios.size):
+        starts = np.flatnonzero(changes[:, k] == 1)
+        ends = np.flatnonzero(changes[:, k] == -1)
+        keep = (ends - starts) >= min_line_width
+        results.append(np.column_stack((starts[keep], ends[keep])))
     
-    return lines
+    return results
 
 
-def detect_edges(projection: List[float], 
+def detect_edges(projection: np.ndarray, 
                  min_edge_strength: float = 30,
-                 min_gap: int = 10) -> List[int]:
+                 min_gap: int = 10,
+                 gradients: Optional[np.ndarray] = None) -> List[int]:
     """
     检测投影数据中的边缘（颜色突变点）
     
@@ -67,49 +110,75 @@ def detect_edges(projection: List[float],
         projection: 投影数据
         min_edge_strength: 最小边缘强度
         min_gap: 边缘之间的最小间隔
+        gradients: 预先计算的梯度（多强度扫描时复用）
     """
-    # 计算梯度
-    gradients = []
-    for i in range(1, len(projection)):
-        gradients.append(abs(projection[i] - projection[i-1]))
+    return detect_edges_batch(projection, [min_edge_strength], min_gap, gradients)[0]
+
+
+def detect_edges_batch(projection: np.ndarray,
+                       edge_strengths: List[float],
+                       min_gap: int = 10,
+                       gradients: Optional[np.ndarray] = None) -> List[List[int]]:
+    """一次性对多个边缘强度检测边缘，梯度只计算一次"""
+    if gradients is None:
+        gradients = np.abs(np.diff(np.asarray(projection)))
+    strengths = np.asarray(edge_strengths, dtype=np.float64)
+    is_edge = gradients[:, None] >= strengths[None, :]
+    
+    return [_filter_min_gap(np.flatnonzero(is_edge[:, k]), min_gap)
+            for k in range(strengths.size)]
+
+
+def _filter_min_gap(candidates: np.ndarray, min_gap: int) -> List[int]:
+    """贪心保证与前一个边缘距离足够：每次直接跳到下一个满足间隔的候选点"""
+    if min_gap <= 1 or candidates.size == 0:
+        return candidates.tolist()
+    
+    if HAS_NUMBA:
+        return greedy_filter_edges(candidates, min_gap).tolist()
     
-    # 找到显著的边缘
     edges = []
-    for i, grad in enumerate(gradients):
-        if grad >= min_edge_strength:
-            # 检查是否与前一个边缘距离足够
-            if not edges or (i - edges[-1]) >= min_gap:
-                edges.append(i)
+    idx = 0
+    while idx < candidates.size:
+        edge = int(candidates[idx])
+        edges.append(edge)
+        idx = int(np.searchsorted(candidates, edge + min_gap))
     
     return edges
 
 
-def find_periodic_lines(lines: List[Tuple[int, int]], 
+def find_periodic_lines(lines: np.ndarray, 
                         total_size: int,
-                        tolerance: float = 0.25) -> Tuple[List[Tuple[int, int]], int]:
-    """从检测到的线中找出周期性的网格线"""
-    if len(lines) < 2:
-        return lines, len(lines) + 1
+                        tolerance: float = 0.25
+                        ) -> Tuple[np.ndarray, int, np.ndarray, np.ndarray]:
+    """
+    从检测到的线中找出周期性的网格线
+    
+    Args:
+        lines: (N, 2) 数组或 [(start, end), ...] 列表
+    
+    Returns:
+        (过滤后的线 (M, 2) 数组, 格子数, 过滤后线的中心, 过滤后线的间距)，
+        中心和间距可直接传给 calculate_confidence 复用
+    """
+    lines = np.asarray(lines, dtype=np.int64).reshape(-1, 2)
+    centers = (lines[:, 0] + lines[:, 1]) * 0.5
     
-    centers = [(s + e) / 2 for s, e in lines]
-    gaps = [centers[i+1] - centers[i] for i in range(len(centers) - 1)]
+    if len(lines) < 2:
+        return lines, len(lines) + 1, centers, np.diff(centers)
     
-    if not gaps:
-        return lines, len(lines) + 1
+    gaps = np.diff(centers)
     
-    median_gap = median(gaps)
+    median_gap = np.median(gaps)
     
-    filtered_lines = []
-    for i, line in enumerate(lines):
-        if i == 0:
-            filtered_lines.append(line)
-        else:
-            gap = centers[i] - centers[i-1]
-            if (1 - tolerance) * median_gap <= gap <= (1 + tolerance) * median_gap:
-                filtered_lines.append(line)
+    # 第一条线始终保留，其余线与前一条线的间距需接近中位间距
+    keep = ((1 - tolerance) * median_gap <= gaps) & (gaps <= (1 + tolerance) * median_gap)
+    kept = np.r_[0, np.flatnonzero(keep) + 1]
+    filtered_lines = lines[kept]
+    filtered_centers = centers[kept]
     
     num_cells = len(filtered_lines) + 1
-    return filtered_lines, num_cells
+    return filtered_lines, num_cells, filtered_centers, np.diff(filtered_centers)
 
 
 def find_periodic_edges(edges: List[int], 
@@ -119,62 +188,75 @@ def find_periodic_edges(edges: List[int],
     if len(edges) < 3:
         return edges, len(edges) + 1
     
-    gaps = [edges[i+1] - edges[i] for i in range(len(edges) - 1)]
-    
-    if not gaps:
-        return edges, 1
+    edges_arr = np.asarray(edges, dtype=np.int64)
+    gaps = np.diff(edges_arr)
     
-    # 找最常见的间隔
-    gap_rounded = [round(g / 5) * 5 for g in gaps]  # 四舍五入到5的倍数
-    gap_counter = Counter(gap_rounded)
-    most_common_gap = gap_counter.most_common(1)[0][0]
+    # 找最常见的间隔（四舍五入到5的倍数，同频时取最先出现的）
+    gap_bins = (gaps + 2) // 5
+    counts = np.bincount(gap_bins)
+    first_top = np.argmax(counts[gap_bins] == counts.max())
+    most_common_gap = int(gap_bins[first_top]) * 5
     
-    # 过滤出符合周期的边缘
+    # 过滤出符合周期的边缘：从上一个保留的边缘直接跳到间隔下限处，
+    # 若该处的边缘超出间隔上限，则后续边缘也不可能符合
+    low = (1 - tolerance) * most_common_gap
+    high = (1 + tolerance) * most_common_gap
     filtered_edges = [edges[0]]
-    for i in range(1, len(edges)):
-        gap = edges[i] - filtered_edges[-1]
-        if (1 - tolerance) * most_common_gap <= gap <= (1 + tolerance) * most_common_gap:
-            filtered_edges.append(edges[i])
+    idx = 1
+    while idx < edges_arr.size:
+        last = filtered_edges[-1]
+        idx = int(np.searchsorted(edges_arr, last + low)) if low > 0 else idx
+        if idx >= edges_arr.size or edges_arr[idx] - last > high:
+            break
+        filtered_edges.append(edges[idx])
+        idx += 1
     
     num_cells = len(filtered_edges)
     return filtered_edges, num_cells
 
 
-def guess_grid_from_size(width: int, height: int) -> List[Tuple[int, int]]:
+# 常见的网格配置 (rows, cols)
+COMMON_GRIDS = np.array([
+    (2, 2), (3, 3), (4, 4), (5, 5), (6, 6), (7, 7), (8, 8),
+    (2, 4), (4, 2), (3, 4), (4, 3), (4, 6), (6, 4),
+    (4, 8), (8, 4), (3, 6), (6, 3), (5, 10), (10, 5),
+    (2, 8), (8, 2), (3, 9), (9, 3), (4, 12), (12, 4)
+], dtype=np.int64)
+
+
+def guess_grid_from_size(width: int, height: int) -> List[Tuple[int, int, float]]:
     """
     根据图片尺寸猜测可能的网格大小
     常见的精灵表尺寸：2x2, 3x3, 4x4, 5x5, 6x6, 8x8, 4x8, 8x4 等
+    
+    Returns:
+        按分数从高到低排列的前 5 个 (rows, cols, score)
     """
-    candidates = []
+    rows, cols = COMMON_GRIDS[:, 0], COMMON_GRIDS[:, 1]
+    cell_w = width / cols
+    cell_h = height / rows
     
-    # 常见的网格配置
-    common_grids = [
-        (2, 2), (3, 3), (4, 4), (5, 5), (6, 6), (7, 7), (8, 8),
-        (2, 4), (4, 2), (3, 4), (4, 3), (4, 6), (6, 4),
-        (4, 8), (8, 4), (3, 6), (6, 3), (5, 10), (10, 5),
-        (2, 8), (8, 2), (3, 9), (9, 3), (4, 12), (12, 4)
-    ]
-    
-    for rows, cols in common_grids:
-        cell_w = width / cols
-        cell_h = height / rows
-        
-        # 检查单元格是否接近正方形或合理比例
-        ratio = cell_w / cell_h if cell_h > 0 else 0
-        if 0.5 <= ratio <= 2.0:
-            # 检查是否整除（允许小误差）
-            w_remainder = width % cols
-            h_remainder = height % rows
-            score = 1.0 - (w_remainder / width + h_remainder / height) / 2
-            candidates.append((rows, cols, score))
-    
-    # 按分数排序
-    candidates.sort(key=lambda x: x[2], reverse=True)
-    return candidates[:5]
-
-
-def calculate_confidence(h_lines, v_lines, rows, cols, height, width) -> float:
-    """计算检测结果的置信度"""
+    # 检查单元格是否接近正方形或合理比例
+    ratio = cell_w / cell_h if height > 0 else np.zeros(len(COMMON_GRIDS))
+    valid = (ratio >= 0.5) & (ratio <= 2.0)
+    
+    # 检查是否整除（允许小误差）
+    scores = 1.0 - ((width % cols) / width + (height % rows) / height) / 2
+    
+    # 按分数排序（稳定排序，同分保持配置顺序）
+    idx = np.flatnonzero(valid)
+    idx = idx[np.argsort(-scores[idx], kind='stable')][:5]
+    return [(int(rows[i]), int(cols[i]), float(scores[i])) for i in idx]
+
+
+def calculate_confidence(h_lines, v_lines, rows, cols, height, width,
+                         h_gaps: Optional[np.ndarray] = None,
+                         v_gaps: Optional[np.ndarray] = None) -> float:
+    """
+    计算检测结果的置信度
+    
+    h_gaps/v_gaps 为相邻线中心的间距，调用方已算出时直接传入以免重复计算
+    """
     confidence = 1.0
     
     expected_h_lines = rows - 1
@@ -185,49 +267,136 @@ def calculate_confidence(h_lines, v_lines, rows, cols, height, width) -> float:
     if len(v_lines) < expected_v_lines:
         confidence *= 0.7
     
-    if len(h_lines) >= 2:
-        h_centers = [(s + e) / 2 for s, e in h_lines]
-        h_gaps = [h_centers[i+1] - h_centers[i] for i in range(len(h_centers) - 1)]
-        if h_gaps and len(h_gaps) > 1:
-            try:
-                h_std = stdev(h_gaps) / mean(h_gaps) if mean(h_gaps) > 0 else 1
-                confidence *= max(0.5, 1 - h_std)
-            except Exception:
-                pass
-    
-    if len(v_lines) >= 2:
-        v_centers = [(s + e) / 2 for s, e in v_lines]
-        v_gaps = [v_centers[i+1] - v_centers[i] for i in range(len(v_centers) - 1)]
-        if v_gaps and len(v_gaps) > 1:
-            try:
-                v_std = stdev(v_gaps) / mean(v_gaps) if mean(v_gaps) > 0 else 1
-                confidence *= max(0.5, 1 - v_std)
-            except Exception:
-                pass
-    
-    return round(confidence, 2)
+    for lines, gaps in ((h_lines, h_gaps), (v_lines, v_gaps)):
+        if gaps is None:
+            lines = np.asarray(lines, dtype=np.float64).reshape(-1, 2)
+            gaps = np.diff((lines[:, 0] + lines[:, 1]) * 0.5)
+        # 检查间距的一致性（变异系数越小越可信）
+        if gaps.size > 1:
+            gap_mean = gaps.mean()
+            gap_cv = gaps.std(ddof=1) / gap_mean if gap_mean > 0 else 1
+            confidence *= max(0.5, 1 - gap_cv)
+    
+    return round(float(confidence), 2)
 
 
-def analyze_spritesheet(image_input: Union[str, bytes, BytesIO, Image.Image],
-                        detection_mode: str = 'auto') -> dict:
+def evaluate_strategy(h_lines: np.ndarray,
+                      v_lines: np.ndarray,
+                      height: int,
+                      width: int,
+                      method: str) -> Optional[dict]:
     """
-    分析精灵表图片，自动检测网格结构
-    
-    Args:
-        image_input: 图片路径、字节数据、BytesIO对象或PIL Image对象
-        detection_mode: 检测模式
-            - 'auto': 自动选择最佳策略
-            - 'dark_lines': 只检测暗色分隔线
-            - 'light_lines': 只检测亮色分隔线
-            - 'edges': 使用边缘检测
-            - 'guess': 基于尺寸猜测
+    对一组候选分隔线做周期过滤并计算置信度
     
     Returns:
-        包含检测结果的字典
+        候选结果字典（含 confidence），行或列不足 2 时返回 None
+    """
+    h_filtered, num_rows, _, h_gaps = find_periodic_lines(h_lines, height)
+    v_filtered, num_cols, _, v_gaps = find_periodic_lines(v_lines, width)
+    
+    if num_rows <= 1 or num_cols <= 1:
+        return None
+    
+    return {
+        'h_lines': h_filtered,
+        'v_lines': v_filtered,
+        'rows': num_rows,
+        'cols': num_cols,
+        'method': method,
+        'confidence': calculate_confidence(h_filtered, v_filtered, num_rows, num_cols,
+                                           height, width, h_gaps, v_gaps),
+    }
+
+
+def _line_candidates(features: dict, method: str, thresholds: Tuple[float, ...],
+                     detect_dark: bool) -> List[Optional[dict]]:
+    """暗线/亮线策略：多阈值检测分隔线并逐一评估"""
+    h_lines_all = detect_grid_lines_batch(features['h_proj'], thresholds,
+                                          detect_dark=detect_dark, proj_mean=features['h_mean'])
+    v_lines_all = detect_grid_lines_batch(features['v_proj'], thresholds,
+                                          detect_dark=detect_dark, proj_mean=features['v_mean'])
+    return [evaluate_strategy(h_lines, v_lines, features['height'], features['width'], method)
+            for h_lines, v_lines in zip(h_lines_all, v_lines_all)]
+
+
+def _edge_candidates(features: dict,
+                     edge_strengths: Tuple[float, ...] = (20, 30, 40)) -> List[Optional[dict]]:
+    """边缘策略：多强度检测颜色突变边界并逐一评估"""
+    height, width = features['height'], features['width']
+    h_edges_all = detect_edges_batch(features['h_proj'], edge_strengths, min_gap=height//20)
+    v_edges_all = detect_edges_batch(features['v_proj'], edge_strengths, min_gap=width//20)
+    
+    candidates = []
+    for h_edges, v_edges in zip(h_edges_all, v_edges_all):
+        h_periodic, num_rows = find_periodic_edges(h_edges, height)
+        v_periodic, num_cols = find_periodic_edges(v_edges, width)
+        
+        if num_rows <= 1 or num_cols <= 1:
+            continue
+        
+        # 将边缘转换为线的格式
+        h_lines = np.column_stack((h_periodic, np.add(h_periodic, 1)))
+        v_lines = np.column_stack((v_periodic, np.add(v_periodic, 1)))
+        
+        conf = calculate_confidence(h_lines, v_lines, num_rows, num_cols, height, width,
+                                    np.diff(h_periodic), np.diff(v_periodic)) * 0.9
+        candidates.append({
+            'h_lines': h_lines,
+            'v_lines': v_lines,
+            'rows': num_rows,
+            'cols': num_cols,
+            'method': 'edges',
+            'confidence': conf,
+        })
+    return candidates
+
+
+# 检测策略表：(方法名, 候选生成函数)，auto 模式按顺序尝试
+_STRATEGIES = [
+    ('dark_lines', partial(_line_candidates, method='dark_lines',
+                           thresholds=(0.2, 0.3, 0.4, 0.5), detect_dark=True)),
+    ('light_lines', partial(_line_candidates, method='light_lines',
+                            thresholds=(0.3, 0.4, 0.5), detect_dark=False)),
+    ('edges', _edge_candidates),
+]
+
+
+def _best_candidate(candidates: List[Optional[dict]]) -> Optional[dict]:
+    """取置信度最高的候选（同分时保留先出现的策略）"""
+    valid = [c for c in candidates if c is not None]
+    return max(valid, key=lambda c: c['confidence']) if valid else None
+
+
+def _is_confident(candidates: List[Optional[dict]]) -> bool:
+    best = _best_candidate(candidates)
+    return best is not None and best['confidence'] >= EARLY_EXIT_CONFIDENCE
+
+
+def _image_fingerprint(image_input) -> Optional[tuple]:
     """
+    为图片输入生成缓存键：文件按路径+修改时间+大小，字节数据按内容哈希
+    PIL Image 对象不缓存
+    """
+    if isinstance(image_input, bytes):
+        return ('bytes', len(image_input), hashlib.blake2b(image_input, digest_size=16).digest())
+    if isinstance(image_input, BytesIO):
+        with image_input.getbuffer() as data:
+            return ('bytes', len(data), hashlib.blake2b(data, digest_size=16).digest())
+    if isinstance(image_input, (str, os.PathLike)):
+        try:
+            stat = os.stat(image_input)
+        except OSError:
+            return None
+        return ('file', os.path.abspath(image_input), stat.st_mtime_ns, stat.st_size)
+    return None
+
+
+def _load_gray_pil(image_input: Union[str, bytes, BytesIO, Image.Image], max_size: int
+                   ) -> Tuple[np.ndarray, Tuple[int, int], float]:
+    """用 Pillow 加载为灰度并缩放，返回 (灰度数组, 原图尺寸, 缩放系数)"""
     # 支持多种输入类型
     if isinstance(image_input, Image.Image):
-        img = image_input.copy()
+        img = image_input
     elif isinstance(image_input, bytes):
         img = Image.open(BytesIO(image_input))
     elif isinstance(image_input, BytesIO):
@@ -238,111 +407,125 @@ def analyze_spritesheet(image_input: Union[str, bytes, BytesIO, Image.Image],
     original_size = (img.width, img.height)
     
     # 缩小图片加速分析
-    max_size = 1000
     if img.width > max_size or img.height > max_size:
         ratio = min(max_size / img.width, max_size / img.height)
         new_size = (int(img.width * ratio), int(img.height * ratio))
+        # 不使用 reducing_gap：先盒式缩小会在细亮线两侧产生振铃暗边，改变亮线/暗线的判定
         img_small = img.resize(new_size, Image.Resampling.LANCZOS)
         scale_factor = 1 / ratio
     else:
         img_small = img
         scale_factor = 1
     
-    # 转为灰度图
+    # 先缩放再转灰度：先转灰度再缩放会改变强制亮线模式的检测结果
     img_gray = img_small.convert('L') if img_small.mode != 'L' else img_small
-    width, height = img_gray.size
     
-    # 计算水平投影（每行平均亮度）
-    horizontal_projection = []
-    for y in range(height):
-        row_sum = sum(img_gray.getpixel((x, y)) for x in range(width))
-        horizontal_projection.append(row_sum / width)
+    # 转为一块连续的 uint8 数组，后续只基于它计算，释放 PIL 图像以节省内存
+    gray = np.asarray(img_gray, dtype=np.uint8)
+    return gray, original_size, scale_factor
+
+
+def _compute_projections(image_input: Union[str, bytes, BytesIO, Image.Image]
+                         ) -> Tuple[np.ndarray, np.ndarray, Tuple[int, int], float]:
+    """
+    加载图片并计算水平/垂直投影
+    
+    结果按图片指纹缓存（最近 PROJECTION_CACHE_SIZE 张），同一图片换检测模式重复分析时直接复用
     
-    # 计算垂直投影（每列平均亮度）
-    vertical_projection = []
-    for x in range(width):
-        col_sum = sum(img_gray.getpixel((x, y)) for y in range(height))
-        vertical_projection.append(col_sum / height)
+    Returns:
+        (水平投影, 垂直投影, 原图尺寸, 缩放系数)
+    """
+    key = _image_fingerprint(image_input)
+    if key is not None:
+        with _projection_cache_lock:
+            cached = _projection_cache.get(key)
+            if cached is not None:
+                _projection_cache.move_to_end(key)
+                return cached
+    
+    max_size = 1000
+    gray, original_size, scale_factor = _load_gray_pil(image_input, max_size)
+    
+    # 计算水平/垂直投影（每行、每列平均亮度）
+    if HAS_NUMBA:
+        horizontal_projection, vertical_projection = project_gray(np.ascontiguousarray(gray))
+    else:
+        # uint32 整数累加（精确且比浮点 mean 更省带宽），最后再换算为平均亮度
+        horizontal_projection = gray.sum(axis=1, dtype=np.uint32).astype(np.float32)
+        horizontal_projection /= gray.shape[1]
+        vertical_projection = gray.sum(axis=0, dtype=np.uint32).astype(np.float32)
+        vertical_projection /= gray.shape[0]
+    # 缓存中的数组被多次复用，设为只读防止被意外修改
+    horizontal_projection.flags.writeable = False
+    vertical_projection.flags.writeable = False
+    
+    result = (horizontal_projection, vertical_projection, original_size, scale_factor)
+    if key is not None:
+        with _projection_cache_lock:
+            _projection_cache[key] = result
+            while len(_projection_cache) > PROJECTION_CACHE_SIZE:
+                _projection_cache.popitem(last=False)
+    return result
+
+
+def analyze_spritesheet(image_input: Union[str, bytes, BytesIO, Image.Image],
+                        detection_mode: str = 'auto') -> dict:
+    """
+    分析精灵表图片，自动检测网格结构
+    
+    Args:
+        image_input: 图片路径、字节数据、BytesIO对象或PIL Image对象
+        detection_mode: 检测模式
+            - 'auto': 自动选择最佳策略
+            - 'dark_lines': 只检测暗色分隔线
+            - 'light_lines': 只检测亮色分隔线
+            - 'edges': 使用边缘检测
+            - 'guess': 基于尺寸猜测
+    
+    Returns:
+        包含检测结果的字典
+    """
+    horizontal_projection, vertical_projection, original_size, scale_factor = \
+        _compute_projections(image_input)
+    height, width = horizontal_projection.size, vertical_projection.size
+    
+    # 各策略共用的特征，只计算一次
+    features = {
+        'h_proj': horizontal_projection,
+        'v_proj': vertical_projection,
+        'h_mean': horizontal_projection.mean(),
+        'v_mean': vertical_projection.mean(),
+        'height': height,
+        'width': width,
+    }
     
     best_result = None
     best_confidence = 0
+    candidates = []
     
-    # 策略1：暗线检测（多阈值）
-    if detection_mode in ['auto', 'dark_lines']:
-        for threshold in [0.2, 0.3, 0.4, 0.5]:
-            h_lines = detect_grid_lines(horizontal_projection, threshold, detect_dark=True)
-            v_lines = detect_grid_lines(vertical_projection, threshold, detect_dark=True)
-            
-            h_filtered, num_rows = find_periodic_lines(h_lines, height)
-            v_filtered, num_cols = find_periodic_lines(v_lines, width)
-            
-            if num_rows > 1 and num_cols > 1:
-                conf = calculate_confidence(h_filtered, v_filtered, num_rows, num_cols, height, width)
-                if conf > best_confidence:
-                    best_confidence = conf
-                    best_result = {
-                        'h_lines': h_filtered,
-                        'v_lines': v_filtered,
-                        'rows': num_rows,
-                        'cols': num_cols,
-                        'method': 'dark_lines'
-                    }
-    
-    # 策略2：亮线检测
-    if detection_mode in ['auto', 'light_lines']:
-        for threshold in [0.3, 0.4, 0.5]:
-            h_lines = detect_grid_lines(horizontal_projection, threshold, detect_dark=False)
-            v_lines = detect_grid_lines(vertical_projection, threshold, detect_dark=False)
-            
-            h_filtered, num_rows = find_periodic_lines(h_lines, height)
-            v_filtered, num_cols = find_periodic_lines(v_lines, width)
-            
-            if num_rows > 1 and num_cols > 1:
-                conf = calculate_confidence(h_filtered, v_filtered, num_rows, num_cols, height, width)
-                if conf > best_confidence:
-                    best_confidence = conf
-                    best_result = {
-                        'h_lines': h_filtered,
-                        'v_lines': v_filtered,
-                        'rows': num_rows,
-                        'cols': num_cols,
-                        'method': 'light_lines'
-                    }
-    
-    # 策略3：边缘检测
-    if detection_mode in ['auto', 'edges']:
-        for edge_strength in [20, 30, 40]:
-            h_edges = detect_edges(horizontal_projection, edge_strength, min_gap=height//20)
-            v_edges = detect_edges(vertical_projection, edge_strength, min_gap=width//20)
-            
-            h_periodic, num_rows = find_periodic_edges(h_edges, height)
-            v_periodic, num_cols = find_periodic_edges(v_edges, width)
-            
-            if num_rows > 1 and num_cols > 1:
-                # 将边缘转换为线的格式
-                h_lines = [(e, e+1) for e in h_periodic]
-                v_lines = [(e, e+1) for e in v_periodic]
-                
-                conf = calculate_confidence(h_lines, v_lines, num_rows, num_cols, height, width) * 0.9
-                if conf > best_confidence:
-                    best_confidence = conf
-                    best_result = {
-                        'h_lines': h_lines,
-                        'v_lines': v_lines,
-                        'rows': num_rows,
-                        'cols': num_cols,
-                        'method': 'edges'
-                    }
+    # 策略1-3 按表顺序执行，已有足够可信的结果时跳过后续策略
+    for method, strategy in _STRATEGIES:
+        if detection_mode not in ('auto', method):
+            continue
+        candidates.extend(strategy(features))
+        if _is_confident(candidates):
+            break
+    
+    best = _best_candidate(candidates)
+    if best is not None and best['confidence'] > 0:
+        best_result = best
+        best_confidence = best['confidence']
     
     # 策略4：基于尺寸猜测（作为后备）
+    no_lines = np.empty((0, 2), dtype=np.int64)
     if detection_mode in ['auto', 'guess'] and best_confidence < 0.5:
         guesses = guess_grid_from_size(original_size[0], original_size[1])
         if guesses:
             rows, cols, score = guesses[0]
             if score > 0.8:  # 高分猜测
                 best_result = {
-                    'h_lines': [],
-                    'v_lines': [],
+                    'h_lines': no_lines,
+                    'v_lines': no_lines,
                     'rows': rows,
                     'cols': cols,
                     'method': 'guess'
@@ -352,36 +535,54 @@ def analyze_spritesheet(image_input: Union[str, bytes, BytesIO, Image.Image],
     # 如果没有检测到，返回默认值
     if best_result is None:
         best_result = {
-            'h_lines': [],
-            'v_lines': [],
+            'h_lines': no_lines,
+            'v_lines': no_lines,
             'rows': 1,
             'cols': 1,
             'method': 'none'
         }
         best_confidence = 0
     
-    # 缩放回原图尺寸
-    h_lines_scaled = best_result['h_lines']
-    v_lines_scaled = best_result['v_lines']
-    if scale_factor != 1:
-        h_lines_scaled = [(int(s * scale_factor), int(e * scale_factor)) 
-                         for s, e in best_result['h_lines']]
-        v_lines_scaled = [(int(s * scale_factor), int(e * scale_factor)) 
-                         for s, e in best_result['v_lines']]
+    # 缩放回原图尺寸（向下取整）
+    h_lines_scaled = (best_result['h_lines'] * scale_factor).astype(np.int64)
+    v_lines_scaled = (best_result['v_lines'] * scale_factor).astype(np.int64)
     
     # 计算建议的 margin
-    all_widths = [e - s for s, e in h_lines_scaled + v_lines_scaled]
-    avg_line_width = mean(all_widths) if all_widths else 2
+    all_widths = np.concatenate((h_lines_scaled, v_lines_scaled))
+    all_widths = all_widths[:, 1] - all_widths[:, 0]
+    avg_line_width = float(all_widths.mean()) if all_widths.size else 2
     suggested_margin = max(1, int(avg_line_width / 2 + 1))
     
     return {
         'rows': best_result['rows'],
         'cols': best_result['cols'],
-        'horizontal_lines': h_lines_scaled,
-        'vertical_lines': v_lines_scaled,
+        'horizontal_lines': [tuple(line) for line in h_lines_scaled.tolist()],
+        'vertical_lines': [tuple(line) for line in v_lines_scaled.tolist()],
         'margin': suggested_margin,
         'line_width': round(avg_line_width, 1),
         'confidence': best_confidence,
         'image_size': original_size,
         'detection_method': best_result['method']
     }
+
+
+def print_analysis_result(result: dict):
+    """打印分析结果"""
+    print("\n" + "=" * 50)
+    print("🔍 精灵表自动分析结果")
+    print("=" * 50)
+    print(f"📐 图片尺寸: {result['image_size'][0]} x {result['image_size'][1]}")
+    print(f"📊 检测到网格: {result['rows']} 行 x {result['cols']} 列")
+    print(f"📏 黑线平均宽度: {result['line_width']:.1f} 像素")
+    print(f"✂️  建议边距 (margin): {result['margin']} 像素")
+    print(f"🎯 置信度: {result['confidence'] * 100:.0f}%")
+    print("-" * 50)
+    
+    if result['confidence'] < 0.5:
+        print("⚠️  置信度较低，建议手动确认网格参数")
+    elif result['confidence'] < 0.8:
+        print("💡 置信度中等，结果可能需要微调")
+    else:
+        print("✅ 检测结果可信度高")
+    
+    print("=" * 50)
@@ -5,10 +5,44 @@ GIF 合成模块
 
 import os
 from PIL import Image
-from typing import List, Union
+from typing import Iterable, Iterator, List, Optional, Union
 from io import BytesIO
 
 
+def _iter_frame_files(frames_folder: str, filenames: List[str]) -> Iterator[Image.Image]:
+    """逐帧读取并解码，解码后立即关闭文件，不会同时占用大量文件句柄"""
+    for filename in filenames:
+        with open(os.path.join(frames_folder, filename), 'rb') as fh:
+            img = Image.open(fh)
+            img.load()
+        yield img
+
+
+def _build_palette(image: Image.Image) -> Image.Image:
+    """对一张 RGB 图做一次颜色量化，返回可作为 quantize(palette=...) 参数的调色板图"""
+    return image.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+
+
+def _quantize_shared_palette(frames: List[Image.Image]) -> List[Image.Image]:
+    """
+    把所有帧量化到同一个调色板
+    
+    所有帧拼在一起只做一次颜色量化，再逐帧映射到该调色板，避免编码时每帧单独量化；
+    帧间颜色一致，也不会因调色板不同产生闪烁。含透明通道等非 RGB 帧保持原样交给编码器处理
+    """
+    if any(frame.mode != 'RGB' for frame in frames):
+        return frames
+    
+    montage = Image.new('RGB', (max(f.width for f in frames), sum(f.height for f in frames)))
+    y = 0
+    for frame in frames:
+        montage.paste(frame, (0, y))
+        y += frame.height
+    master = _build_palette(montage)
+    
+    return [frame.quantize(palette=master, dither=Image.Dither.NONE) for frame in frames]
+
+
 def create_gif(frames_folder: str,
                output_path: str,
                duration: int = 100) -> str:
@@ -28,18 +62,17 @@ def create_gif(frames_folder: str,
     if not filenames:
         raise ValueError(f"在 {frames_folder} 中没有找到 PNG 图片")
     
-    images = []
-    for filename in filenames:
-        filepath = os.path.join(frames_folder, filename)
-        images.append(Image.open(filepath))
-    
-    images[0].save(
+    # 帧以生成器形式交给编码器，按需解码
+    images = _iter_frame_files(frames_folder, filenames)
+    first = next(images)
+    first.save(
         output_path,
         save_all=True,
-        append_images=images[1:],
+        append_images=images,
         duration=duration,
         loop=0,
-        disposal=2
+        disposal=2,
+        optimize=False
     )
     
     return output_path
@@ -62,11 +95,41 @@ def create_gif_from_frames(frames: List[Image.Image],
     if not frames:
         raise ValueError("帧列表为空")
     
+    return create_gif_stream(_quantize_shared_palette(frames), duration, output_path)
+
+
+def create_gif_stream(frames: Iterable[Image.Image],
+                      duration: int = 100,
+                      output_path: str = None,
+                      palette_source: Optional[Image.Image] = None) -> Union[str, bytes]:
+    """
+    从帧迭代器流式合成 GIF，帧在编码时才逐个取出
+    
+    Args:
+        frames: PIL Image 可迭代对象（可以是生成器）
+        duration: 每帧的持续时间（毫秒）
+        output_path: 输出路径（如果为None则返回字节数据）
+        palette_source: 用于生成共享调色板的 RGB 图（通常是整张精灵表），
+                        为 None 或非 RGB 时由编码器逐帧量化
+    
+    Returns:
+        如果指定了 output_path，返回路径；否则返回 GIF 字节数据
+    """
+    frames = iter(frames)
+    if palette_source is not None and palette_source.mode == 'RGB':
+        master = _build_palette(palette_source)
+        frames = (frame.quantize(palette=master, dither=Image.Dither.NONE) for frame in frames)
+    
+    first = next(frames, None)
+    if first is None:
+        raise ValueError("帧列表为空")
+    
+    # 这里保留编码器默认的 optimize：共享调色板的帧可按与上一帧的差异区域裁剪，静态背景的动画体积可减半
     if output_path:
-        frames[0].save(
+        first.save(
             output_path,
             save_all=True,
-            append_images=frames[1:],
+            append_images=frames,
             duration=duration,
             loop=0,
             disposal=2
@@ -74,15 +137,14 @@ def create_gif_from_frames(frames: List[Image.Image],
         return output_path
     else:
         buffer = BytesIO()
-        frames[0].save(
+        first.save(
             buffer,
             format='GIF',
             save_all=True,
-            append_images=frames[1:],
+            append_images=frames,
             duration=duration,
             loop=0,
             disposal=2
         )
-        buffer.seek(0)
+        # getvalue 在缓冲区未被导出时直接交出内部 bytes，无需 seek 也不会额外复制
         return buffer.getvalue()
-
@@ -4,16 +4,33 @@
 """
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
-from typing import List, Union
+from typing import Iterator, List, Union
 from io import BytesIO
 
+# 并行保存帧文件的线程数（PNG 压缩在 zlib 中执行时会释放 GIL）
+SAVE_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def _cell_boxes(img_width: int, img_height: int, rows: int, cols: int, margin: int) -> List[tuple]:
+    """
+    按行优先顺序计算每个格子的裁剪框
+    
+    格子边界用整数运算一次性算出，相邻格子严格首尾相接，不受浮点舍入影响
+    """
+    xs = [c * img_width // cols for c in range(cols + 1)]
+    ys = [r * img_height // rows for r in range(rows + 1)]
+    return [(xs[c] + margin, ys[r] + margin, xs[c + 1] - margin, ys[r + 1] - margin)
+            for r in range(rows) for c in range(cols)]
+
 
 def slice_spritesheet(image_input: Union[str, bytes, BytesIO, Image.Image],
                       output_folder: str,
                       rows: int,
                       cols: int,
-                      margin: int = 2) -> List[str]:
+                      margin: int = 2,
+                      compress_level: int = 6) -> List[str]:
     """
     切分网格图片并保存为单独的帧文件
     
@@ -23,6 +40,7 @@ def slice_spritesheet(image_input: Union[str, bytes, BytesIO, Image.Image],
         rows: 网格行数
         cols: 网格列数
         margin: 向内裁剪的边距像素
+        compress_level: PNG 压缩级别（0-9），越小编码越快、文件越大
     
     Returns:
         保存的文件路径列表
@@ -37,40 +55,58 @@ def slice_spritesheet(image_input: Union[str, bytes, BytesIO, Image.Image],
     else:
         img = Image.open(image_input)
     
-    # 创建输出文件夹
-    os.makedirs(output_folder, exist_ok=True)
+    frames = [img.crop(box) for box in _cell_boxes(img.width, img.height, rows, cols, margin)]
+    return save_frames(frames, output_folder, compress_level)
+
+
+def save_frames(frames: List[Image.Image],
+                output_folder: str,
+                compress_level: int = 6) -> List[str]:
+    """
+    把已切好的帧保存为 frame_001.png、frame_002.png ...
     
-    img_width, img_height = img.size
-    cell_width = img_width / cols
-    cell_height = img_height / rows
+    Args:
+        frames: PIL Image 对象列表
+        output_folder: 输出文件夹路径
+        compress_level: PNG 压缩级别（0-9），越小编码越快、文件越大
     
-    saved_files = []
-    count = 1
+    Returns:
+        保存的文件路径列表
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    saved_files = [os.path.join(output_folder, f"frame_{i:03d}.png") for i in range(1, len(frames) + 1)]
     
-    for r in range(rows):
-        for c in range(cols):
-            left = c * cell_width
-            upper = r * cell_height
-            right = left + cell_width
-            lower = upper + cell_height
-            
-            crop_box = (
-                int(left + margin),
-                int(upper + margin),
-                int(right - margin),
-                int(lower - margin)
-            )
-            
-            frame = img.crop(crop_box)
-            filename = f"frame_{count:03d}.png"
-            save_path = os.path.join(output_folder, filename)
-            frame.save(save_path, "PNG")
-            saved_files.append(save_path)
-            count += 1
+    # 编码写盘并行执行
+    with ThreadPoolExecutor(max_workers=SAVE_WORKERS) as executor:
+        list(executor.map(lambda frame, path: frame.save(path, "PNG", compress_level=compress_level),
+                          frames, saved_files))
     
     return saved_files
 
 
+def slice_spritesheet_iter(image_input: Union[str, bytes, BytesIO, Image.Image],
+                           rows: int,
+                           cols: int,
+                           margin: int = 2) -> Iterator[Image.Image]:
+    """
+    按行优先顺序逐帧切分网格图片（生成器，取用时才裁剪）
+    
+    参数同 slice_spritesheet_to_frames
+    """
+    # 支持多种输入类型
+    if isinstance(image_input, Image.Image):
+        img = image_input
+    elif isinstance(image_input, bytes):
+        img = Image.open(BytesIO(image_input))
+    elif isinstance(image_input, BytesIO):
+        img = Image.open(image_input)
+    else:
+        img = Image.open(image_input)
+    
+    for box in _cell_boxes(img.width, img.height, rows, cols, margin):
+        yield img.crop(box)
+
+
 def slice_spritesheet_to_frames(image_input: Union[str, bytes, BytesIO, Image.Image],
                                  rows: int,
                                  cols: int,
@@ -87,38 +123,4 @@ def slice_spritesheet_to_frames(image_input: Union[str, bytes, BytesIO, Image.Im
     Returns:
         PIL Image对象列表
     """
-    # 支持多种输入类型
-    if isinstance(image_input, Image.Image):
-        img = image_input
-    elif isinstance(image_input, bytes):
-        img = Image.open(BytesIO(image_input))
-    elif isinstance(image_input, BytesIO):
-        img = Image.open(image_input)
-    else:
-        img = Image.open(image_input)
-    
-    img_width, img_height = img.size
-    cell_width = img_width / cols
-    cell_height = img_height / rows
-    
-    frames = []
-    
-    for r in range(rows):
-        for c in range(cols):
-            left = c * cell_width
-            upper = r * cell_height
-            right = left + cell_width
-            lower = upper + cell_height
-            
-            crop_box = (
-                int(left + margin),
-                int(upper + margin),
-                int(right - margin),
-                int(lower - margin)
-            )
-            
-            frame = img.crop(crop_box)
-            frames.append(frame)
-    
-    return frames
-
+    return list(slice_spritesheet_iter(image_input, rows, cols, margin))
@@ -0,0 +1,114 @@
+"""检测模块测试：合成网格图的行列/边距，以及边缘间隔过滤"""
+
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import core.detector as detector
+from core.detector import analyze_spritesheet, _filter_min_gap
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       'examples', '柯南攻击图片.jpg')
+
+DARK_ON_LIGHT = ((235, 235, 235), (20, 20, 20))
+LIGHT_ON_DARK = ((25, 25, 25), (240, 240, 240))
+
+
+def make_sheet(rows, cols, cell, line, background, line_color):
+    """生成带分隔线的网格图，每格中间放一个色块充当精灵"""
+    sheet = np.empty((rows * cell, cols * cell, 3), dtype=np.uint8)
+    sheet[:] = background
+    rng = np.random.default_rng(0)
+    for r in range(rows):
+        for c in range(cols):
+            y, x = r * cell + cell // 4, c * cell + cell // 4
+            sheet[y:y + cell // 2, x:x + cell // 2] = rng.integers(90, 180, 3)
+    half = line // 2
+    for r in range(1, rows):
+        sheet[r * cell - half:r * cell + half, :] = line_color
+    for c in range(1, cols):
+        sheet[:, c * cell - half:c * cell + half] = line_color
+    return Image.fromarray(sheet)
+
+
+@pytest.fixture(autouse=True)
+def clear_projection_cache():
+    detector._projection_cache.clear()
+
+
+@pytest.mark.parametrize('colors, method', [
+    (DARK_ON_LIGHT, 'dark_lines'),
+    (LIGHT_ON_DARK, 'light_lines'),
+])
+@pytest.mark.parametrize('rows, cols, cell, line, margin', [
+    (2, 2, 96, 4, 3),
+    (3, 4, 96, 4, 3),
+    (4, 4, 64, 2, 2),
+    (6, 6, 150, 6, 4),
+    (2, 8, 96, 4, 3),
+    (8, 8, 96, 4, 3),
+])
+def test_synthetic_sheet(rows, cols, cell, line, margin, colors, method):
+    result = analyze_spritesheet(make_sheet(rows, cols, cell, line, *colors))
+    
+    assert (result['rows'], result['cols']) == (rows, cols)
+    assert result['margin'] == margin
+    assert result['detection_method'] == method
+    assert result['image_size'] == (cols * cell, rows * cell)
+
+
+@pytest.mark.parametrize('colors', [DARK_ON_LIGHT, LIGHT_ON_DARK])
+def test_synthetic_sheet_downscaled(colors):
+    # 超过 1000px 的图会先缩小再检测
+    result = analyze_spritesheet(make_sheet(8, 8, 200, 4, *colors))
+    
+    assert (result['rows'], result['cols']) == (8, 8)
+    assert result['margin'] == 2
+
+
+def test_input_types_agree():
+    with open(EXAMPLE, 'rb') as fh:
+        data = fh.read()
+    
+    from_path = analyze_spritesheet(EXAMPLE)
+    detector._projection_cache.clear()
+    from_bytes = analyze_spritesheet(data)
+    detector._projection_cache.clear()
+    from_image = analyze_spritesheet(Image.open(EXAMPLE))
+    
+    assert from_path == from_bytes == from_image
+
+
+@pytest.mark.parametrize('mode, expected', [
+    ('auto', (6, 6, 3)),
+    ('dark_lines', (6, 6, 3)),
+    ('light_lines', (8, 2, 6)),
+])
+def test_example_sheet(mode, expected):
+    result = analyze_spritesheet(EXAMPLE, mode)
+    
+    assert (result['rows'], result['cols'], result['margin']) == expected
+
+
+def greedy_min_gap(candidates, min_gap):
+    """原先的逐个比较实现，作为 _filter_min_gap 的参照"""
+    edges = []
+    for i in candidates:
+        if not edges or (i - edges[-1]) >= min_gap:
+            edges.append(int(i))
+    return edges
+
+
+@pytest.mark.parametrize('use_numba', [False, pytest.param(True, marks=pytest.mark.skipif(
+    not detector.HAS_NUMBA, reason='numba 未安装'))])
+def test_filter_min_gap_matches_greedy(monkeypatch, use_numba):
+    monkeypatch.setattr(detector, 'HAS_NUMBA', use_numba)
+    rng = np.random.default_rng(42)
+    
+    for _ in range(200):
+        size = int(rng.integers(0, 60))
+        candidates = np.unique(rng.integers(0, 500, size)).astype(np.int64)
+        min_gap = int(rng.integers(0, 40))
+        assert _filter_min_gap(candidates, min_gap) == greedy_min_gap(candidates, min_gap)
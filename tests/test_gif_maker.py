@@ -0,0 +1,82 @@
+"""GIF 合成测试：帧数、时长与像素往返"""
+
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image, ImageSequence
+
+from core.gif_maker import create_gif_from_frames, create_gif_stream, _quantize_shared_palette
+from core.slicer import slice_spritesheet_iter
+
+COLORS = [(255, 0, 0), (0, 200, 0), (0, 0, 255), (250, 250, 0), (30, 30, 30), (255, 255, 255)]
+
+
+def make_frames(count=6, size=(16, 12)):
+    """每帧底色不同，并在不同位置放一个小方块，使相邻帧有差异区域"""
+    frames = []
+    for i in range(count):
+        frame = Image.new('RGB', size, COLORS[i % len(COLORS)])
+        frame.paste(COLORS[(i + 1) % len(COLORS)], (i, i, i + 4, i + 4))
+        frames.append(frame)
+    return frames
+
+
+def read_gif(data):
+    with Image.open(BytesIO(data)) as gif:
+        durations = [frame.info.get('duration') for frame in ImageSequence.Iterator(gif)]
+        gif.seek(0)
+        pixels = [np.asarray(frame.convert('RGB')) for frame in ImageSequence.Iterator(gif)]
+    return pixels, durations
+
+
+def test_shared_palette():
+    quantized = _quantize_shared_palette(make_frames())
+    
+    assert all(frame.mode == 'P' for frame in quantized)
+    palettes = {bytes(frame.getpalette()) for frame in quantized}
+    assert len(palettes) == 1
+
+
+def test_shared_palette_keeps_non_rgb_frames():
+    frames = [Image.new('RGBA', (4, 4), (255, 0, 0, 128)) for _ in range(2)]
+    
+    assert _quantize_shared_palette(frames) is frames
+
+
+def test_create_gif_from_frames_round_trip():
+    frames = make_frames()
+    pixels, durations = read_gif(create_gif_from_frames(frames, duration=80))
+    
+    assert len(pixels) == len(frames)
+    assert durations == [80] * len(frames)
+    for decoded, frame in zip(pixels, frames):
+        np.testing.assert_array_equal(decoded, np.asarray(frame))
+
+
+def test_create_gif_stream_with_palette_source():
+    frames = make_frames()
+    sheet = Image.new('RGB', (16 * 3, 12 * 2))
+    for i, frame in enumerate(frames):
+        sheet.paste(frame, ((i % 3) * 16, (i // 3) * 12))
+    
+    data = create_gif_stream(slice_spritesheet_iter(sheet, 2, 3, margin=0), 50, palette_source=sheet)
+    pixels, durations = read_gif(data)
+    
+    assert len(pixels) == len(frames)
+    assert durations == [50] * len(frames)
+    for decoded, frame in zip(pixels, frames):
+        np.testing.assert_array_equal(decoded, np.asarray(frame))
+
+
+def test_create_gif_stream_to_file(tmp_path):
+    output = tmp_path / 'out.gif'
+    
+    assert create_gif_stream(iter(make_frames(3)), 100, str(output)) == str(output)
+    with Image.open(output) as gif:
+        assert gif.n_frames == 3
+
+
+def test_create_gif_stream_empty():
+    with pytest.raises(ValueError):
+        create_gif_stream(iter([]))
@@ -0,0 +1,48 @@
+"""切片模块测试：格子边界的整数划分"""
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from core.slicer import _cell_boxes, slice_spritesheet_to_frames
+
+
+@pytest.mark.parametrize('width, height, rows, cols', [
+    (600, 600, 6, 6),
+    (601, 599, 6, 6),
+    (1000, 333, 3, 7),
+    (17, 5, 5, 4),
+    (1, 1, 1, 1),
+])
+def test_cell_boxes_tile_image(width, height, rows, cols):
+    boxes = _cell_boxes(width, height, rows, cols, 0)
+    assert len(boxes) == rows * cols
+    
+    # 每个像素恰好被一个格子覆盖：无缝隙、无重叠
+    coverage = np.zeros((height, width), dtype=np.int32)
+    for left, top, right, bottom in boxes:
+        assert all(isinstance(v, int) for v in (left, top, right, bottom))
+        coverage[top:bottom, left:right] += 1
+    assert (coverage == 1).all()
+
+
+def test_cell_boxes_row_major_with_margin():
+    boxes = _cell_boxes(100, 60, 2, 3, 2)
+    
+    assert boxes[0] == (2, 2, 31, 28)
+    assert boxes[2] == (68, 2, 98, 28)
+    assert boxes[3] == (2, 32, 31, 58)
+    assert boxes == [(l0 + 2, t0 + 2, r0 - 2, b0 - 2)
+                     for l0, t0, r0, b0 in _cell_boxes(100, 60, 2, 3, 0)]
+
+
+def test_slice_frames_content():
+    sheet = Image.new('RGB', (30, 20))
+    colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (0, 255, 255), (255, 0, 255)]
+    for i, color in enumerate(colors):
+        sheet.paste(color, ((i % 3) * 10, (i // 3) * 10, (i % 3) * 10 + 10, (i // 3) * 10 + 10))
+    
+    frames = slice_spritesheet_to_frames(sheet, 2, 3, margin=1)
+    
+    assert [f.size for f in frames] == [(8, 8)] * 6
+    assert [f.getcolors() for f in frames] == [[(64, color)] for color in colors]
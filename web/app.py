@@ -4,19 +4,33 @@ Flask 后端 API
 """
 
 import os
+import re
 import sys
 import uuid
 import time
 import shutil
 import threading
-import json
 import logging
 import traceback
 from datetime import datetime, timedelta
 import base64
-from flask import Flask, request, jsonify, send_file, render_template
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, jsonify, send_file, send_from_directory, render_template
 from werkzeug.utils import secure_filename
 from io import BytesIO
+from PIL import Image
+
+try:
+    from flask_compress import Compress
+    HAS_COMPRESS = True
+except ImportError:
+    HAS_COMPRESS = False
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，开发服务器为单进程，清理时不加跨进程锁
+    fcntl = None
 
 # 配置日志
 logging.basicConfig(
@@ -29,14 +43,21 @@ logger = logging.getLogger(__name__)
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from core import analyze_spritesheet, slice_spritesheet_to_frames, create_gif_from_frames
-from core.slicer import slice_spritesheet
+from core import analyze_spritesheet, slice_spritesheet_to_frames, save_frames, create_gif_stream
+from web import jsonutil
 from web.idea_generator import generate_idea_plan
 from web.sprite_generator import generate_spritesheet, save_generated_image
 from web.coupons import consume_coupon, refund_coupon_usage, CouponError, CouponConfigError
 
 app = Flask(__name__)
 
+# 安装了 flask-compress 时压缩较大的 JSON 响应；GIF 本身已压缩，不在 COMPRESS_MIMETYPES 内
+if HAS_COMPRESS:
+    app.config['COMPRESS_MIMETYPES'] = ['application/json']
+    app.config['COMPRESS_LEVEL'] = 6
+    app.config['COMPRESS_MIN_SIZE'] = 500
+    Compress(app)
+
 # ============================================
 # 配置
 # ============================================
@@ -50,8 +71,20 @@ FRAMES_FOLDER = os.path.join(DATA_FOLDER, 'frames')          # 切分后的帧
 GIFS_FOLDER = os.path.join(DATA_FOLDER, 'gifs')              # 生成的 GIF
 TEMP_FOLDER = os.path.join(DATA_FOLDER, 'temp')              # 临时文件
 
+# 任务 ID 只允许字母、数字、下划线和连字符，并限制长度，防止路径穿越
+_TASK_ID_RE = re.compile(r'[A-Za-z0-9_-]{1,64}\Z')
+
 # 文件限制
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp'}
+
+# 支持格式的文件头魔数，解码前据此快速拒绝非图片内容
+IMAGE_MAGIC = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'BM', 'bmp'),
+)
 MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
 
 # 文件保留时间（秒）
@@ -61,6 +94,45 @@ FILE_MAX_AGE = FILE_RETENTION_DAYS * 24 * 3600  # 30天
 # 清理间隔（秒）
 CLEANUP_INTERVAL = 6 * 3600  # 每6小时清理一次
 
+# 内存缓存（task_id -> (写入时间, 数据)），超过 MEMORY_CACHE_TTL 秒由清理线程淘汰；
+# 磁盘文件仍然保留，多进程部署或缓存未命中时从磁盘读取
+MEMORY_CACHE_TTL = 10 * 60
+IMAGE_CACHE_SIZE = 8    # 已解码图片：analyze 解码后 convert 直接复用
+# 已解码图片按像素数据总字节数（宽 × 高 × 通道数）限制，单张超过上限的不缓存，转换时从磁盘读取
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_MB', 128)) * 1024 * 1024
+GIF_CACHE_SIZE = 16     # 生成的 GIF（文件 mtime, 数据）：文件未被其他进程重写时直接从内存返回
+_image_cache = OrderedDict()
+_gif_cache = OrderedDict()
+_memory_cache_lock = threading.Lock()
+
+# 任务元数据缓存（写穿到 *_meta.json），避免每次读取都重新解析 JSON
+META_CACHE_SIZE = 64
+_meta_cache = OrderedDict()
+_meta_cache_lock = threading.Lock()
+
+# 上传原图在后台线程写盘，与解码和分析并行；返回响应前等待写盘完成，
+# 多进程部署时后续 /api/convert 落到其他 worker 也能读到原图
+_persist_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='persist')
+
+# 转换（切分、保存帧、编码 GIF）在后台线程执行，接口立即返回 202，前端轮询 /api/status
+CONVERT_WORKERS = int(os.environ.get('CONVERT_WORKERS', 2))
+_convert_executor = ThreadPoolExecutor(max_workers=CONVERT_WORKERS, thread_name_prefix='convert')
+
+# 转换参数范围（与前端输入框一致）
+MAX_GRID_SIZE = 50
+MAX_FRAME_DURATION = 10000
+
+# 转换进行中标记文件（TEMP_FOLDER/<task_id>.converting）以 O_EXCL 创建，多进程间互斥；
+# 超过该时长的标记视为进程异常退出遗留，允许重新转换
+CONVERT_MARKER_TIMEOUT = 30 * 60
+
+# 是否额外把上传复制到临时目录（默认只保存原图，转换时优先走内存，其次读原图）
+PERSIST_UPLOADS = os.environ.get('PERSIST_UPLOADS', '0') == '1'
+
+# 部署在 nginx 之后时，GIF 通过 X-Accel-Redirect 交给 nginx 直接发送（需配置对应的 internal location）
+USE_X_ACCEL = os.environ.get('USE_X_ACCEL', '0') == '1'
+X_ACCEL_GIFS_PREFIX = os.environ.get('X_ACCEL_GIFS_PREFIX', '/internal_gifs/')
+
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
 # 确保目录存在
@@ -77,6 +149,16 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def sniff_image_format(head):
+    """根据文件头判断图片格式，不是支持的格式时返回 None"""
+    for magic, fmt in IMAGE_MAGIC:
+        if head.startswith(magic):
+            return fmt
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
 def get_file_ext(filename):
     """获取文件扩展名"""
     return filename.rsplit('.', 1)[1].lower() if '.' in filename else 'jpg'
@@ -89,11 +171,165 @@ def generate_task_id():
     return f"{timestamp}_{short_uuid}"
 
 
+def write_atomic(path, data):
+    """
+    把整块数据写入文件：先写同目录下的临时文件再 os.replace，
+    读取方（预览、下载、其他进程读元数据）不会看到写了一半的文件
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+    view = memoryview(data)
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        # os.write 直接使用缓冲区协议，大块数据通常一次系统调用写完
+        while view:
+            view = view[os.write(fd, view):]
+    except BaseException:
+        os.close(fd)
+        os.unlink(tmp_path)
+        raise
+    os.close(fd)
+    os.replace(tmp_path, path)
+
+
 def save_metadata(task_id, metadata):
-    """保存任务元数据"""
+    """保存任务元数据（写盘并更新内存缓存）"""
     meta_path = os.path.join(DATA_FOLDER, f"{task_id}_meta.json")
-    with open(meta_path, 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, ensure_ascii=False, indent=2)
+    write_atomic(meta_path, jsonutil.dumps(metadata, indent=True))
+    with _meta_cache_lock:
+        _meta_cache[task_id] = metadata
+        _meta_cache.move_to_end(task_id)
+        while len(_meta_cache) > META_CACHE_SIZE:
+            _meta_cache.popitem(last=False)
+
+
+def load_meta(task_id, fresh=False):
+    """
+    读取任务元数据，优先使用内存缓存，不存在时返回 None
+    
+    fresh=True 时跳过缓存直接读盘：多进程部署下其他进程可能已经更新了元数据
+    """
+    if not fresh:
+        with _meta_cache_lock:
+            metadata = _meta_cache.get(task_id)
+        if metadata is not None:
+            return metadata
+    
+    meta_path = os.path.join(DATA_FOLDER, f"{task_id}_meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'rb') as f:
+        metadata = jsonutil.loads(f.read())
+    with _meta_cache_lock:
+        _meta_cache[task_id] = metadata
+        while len(_meta_cache) > META_CACHE_SIZE:
+            _meta_cache.popitem(last=False)
+    return metadata
+
+
+def update_meta(task_id, **fields):
+    """
+    更新任务元数据的部分字段并写回，元数据不存在时返回 None
+    
+    先从磁盘重新读取再合并，避免用本进程缓存里的旧数据覆盖其他 worker 写入的字段
+    """
+    metadata = load_meta(task_id, fresh=True)
+    if metadata is None:
+        return None
+    metadata = {**metadata, **fields}
+    save_metadata(task_id, metadata)
+    return metadata
+
+
+def _cache_put(cache, max_size, task_id, value):
+    """写入内存缓存，超出容量时淘汰最早的"""
+    with _memory_cache_lock:
+        cache[task_id] = (time.time(), value)
+        cache.move_to_end(task_id)
+        while len(cache) > max_size:
+            cache.popitem(last=False)
+
+
+def _cache_get(cache, task_id, pop=False):
+    """读取内存缓存，不存在或已过期时返回 None"""
+    with _memory_cache_lock:
+        entry = cache.pop(task_id, None) if pop else cache.get(task_id)
+    if entry is None or time.time() - entry[0] > MEMORY_CACHE_TTL:
+        return None
+    return entry[1]
+
+
+def evict_memory_caches():
+    """淘汰内存缓存中的过期条目"""
+    expire_before = time.time() - MEMORY_CACHE_TTL
+    with _memory_cache_lock:
+        for cache in (_image_cache, _gif_cache):
+            for task_id in [k for k, (cached_at, _) in cache.items() if cached_at < expire_before]:
+                del cache[task_id]
+
+
+def _image_nbytes(img):
+    """已解码图片占用的像素数据字节数"""
+    return img.width * img.height * len(img.getbands())
+
+
+def cache_decoded_image(task_id, img):
+    """缓存已解码的图片，条目数或总字节数超出上限时淘汰最早的"""
+    if _image_nbytes(img) > IMAGE_CACHE_MAX_BYTES:
+        return
+    with _memory_cache_lock:
+        _image_cache[task_id] = (time.time(), img)
+        _image_cache.move_to_end(task_id)
+        total = sum(_image_nbytes(cached) for _, cached in _image_cache.values())
+        while len(_image_cache) > IMAGE_CACHE_SIZE or total > IMAGE_CACHE_MAX_BYTES:
+            _, (_, evicted) = _image_cache.popitem(last=False)
+            total -= _image_nbytes(evicted)
+
+
+def pop_decoded_image(task_id):
+    """取出已解码的图片，不在缓存中时返回 None"""
+    return _cache_get(_image_cache, task_id, pop=True)
+
+
+def persist_upload(task_id, original_path, image_data):
+    """保存上传原图（在后台线程执行），按需再链接一份到临时目录；失败时异常由调用方的 future 抛出"""
+    try:
+        write_atomic(original_path, image_data)
+        logger.info(f"原图已保存: {original_path}")
+        if PERSIST_UPLOADS:
+            # 临时文件硬链接到原图，不再重复写一份数据；文件系统不支持时退回复制
+            temp_path = os.path.join(TEMP_FOLDER, f"{task_id}.tmp")
+            try:
+                os.link(original_path, temp_path)
+            except OSError:
+                shutil.copyfile(original_path, temp_path)
+    except Exception as e:
+        logger.error(f"原图保存失败: {original_path}, 错误: {e}")
+        raise
+
+
+def load_upload_image(task_id):
+    """
+    取得待转换的上传图片，依次尝试：
+    内存中的解码图片 -> 临时文件 -> 元数据记录的原图
+    
+    都不存在时返回 None
+    """
+    img = pop_decoded_image(task_id)
+    if img is not None:
+        return img
+    
+    path = os.path.join(TEMP_FOLDER, f"{task_id}.tmp")
+    if not os.path.exists(path):
+        metadata = load_meta(task_id)
+        if metadata is None:
+            return None
+        path = metadata.get('original_path')
+        if not path or not os.path.exists(path):
+            return None
+    
+    img = Image.open(path)
+    img.load()
+    return img
 
 
 def require_coupon_usage(data):
@@ -112,6 +348,22 @@ def require_coupon_usage(data):
         return None, (jsonify({'error': str(exc)}), 403)
 
 
+def _expired_entries(folder, now, suffix=None):
+    """列出目录下超过保留期的条目；scandir 自带类型信息，每个条目只需一次 stat"""
+    try:
+        with os.scandir(folder) as it:
+            for entry in it:
+                if suffix and not entry.name.endswith(suffix):
+                    continue
+                try:
+                    if now - entry.stat(follow_symlinks=False).st_mtime > FILE_MAX_AGE:
+                        yield entry
+                except OSError:
+                    continue
+    except FileNotFoundError:
+        return
+
+
 def cleanup_old_files():
     """清理过期文件"""
     now = time.time()
@@ -119,44 +371,59 @@ def cleanup_old_files():
     
     # 清理各个目录
     for folder in [ORIGINALS_FOLDER, FRAMES_FOLDER, GIFS_FOLDER, TEMP_FOLDER]:
-        if not os.path.exists(folder):
-            continue
-            
-        for item in os.listdir(folder):
-            item_path = os.path.join(folder, item)
+        for entry in _expired_entries(folder, now):
             try:
-                item_time = os.path.getmtime(item_path)
-                if now - item_time > FILE_MAX_AGE:
-                    if os.path.isfile(item_path):
-                        os.remove(item_path)
-                    elif os.path.isdir(item_path):
-                        shutil.rmtree(item_path)
-                    cleaned_count += 1
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.unlink(entry.path)
+                cleaned_count += 1
             except Exception as e:
-                print(f"[清理] 删除失败: {item_path}, 错误: {e}")
+                print(f"[清理] 删除失败: {entry.path}, 错误: {e}")
     
     # 清理元数据文件
-    for item in os.listdir(DATA_FOLDER):
-        if item.endswith('_meta.json'):
-            item_path = os.path.join(DATA_FOLDER, item)
-            try:
-                if now - os.path.getmtime(item_path) > FILE_MAX_AGE:
-                    os.remove(item_path)
-                    cleaned_count += 1
-            except Exception:
-                pass
+    for entry in _expired_entries(DATA_FOLDER, now, suffix='_meta.json'):
+        try:
+            os.unlink(entry.path)
+            cleaned_count += 1
+        except Exception:
+            pass
     
     if cleaned_count > 0:
         print(f"[清理] 已清理 {cleaned_count} 个过期文件/目录")
 
 
+def sweep_old_files():
+    """
+    清理过期文件，多进程部署时加文件锁
+    
+    每个 worker 都有自己的清理线程，拿不到锁说明其他 worker 正在清理，本次直接跳过
+    """
+    if fcntl is None:
+        cleanup_old_files()
+        return
+    with open(os.path.join(DATA_FOLDER, 'cleanup.lock'), 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        cleanup_old_files()
+
+
 def start_cleanup_thread():
-    """启动后台清理线程"""
+    """启动后台清理线程（内存缓存属于各自进程，每个 worker 都需要一个）"""
     def cleanup_loop():
+        # 启动时先清理一次旧文件
+        sweep_old_files()
+        last_file_cleanup = time.time()
         while True:
-            time.sleep(CLEANUP_INTERVAL)
-            print(f"[清理] 开始清理超过 {FILE_RETENTION_DAYS} 天的文件...")
-            cleanup_old_files()
+            # 内存缓存按 TTL 频繁淘汰，磁盘文件按 CLEANUP_INTERVAL 清理
+            time.sleep(MEMORY_CACHE_TTL)
+            evict_memory_caches()
+            if time.time() - last_file_cleanup >= CLEANUP_INTERVAL:
+                print(f"[清理] 开始清理超过 {FILE_RETENTION_DAYS} 天的文件...")
+                sweep_old_files()
+                last_file_cleanup = time.time()
     
     thread = threading.Thread(target=cleanup_loop, daemon=True)
     thread.start()
@@ -349,32 +616,49 @@ def analyze():
         logger.warning(f"不支持的文件格式: {file.filename}")
         return jsonify({'error': '不支持的文件格式'}), 400
     
+    # 只读文件头校验内容，非图片文件不进入解码
+    head = file.stream.read(12)
+    file.stream.seek(0)
+    if sniff_image_format(head) is None:
+        logger.warning(f"文件内容不是支持的图片格式: {file.filename}")
+        return jsonify({'error': '文件内容不是有效的图片'}), 400
+    
     try:
         # 生成任务ID
         task_id = generate_task_id()
         logger.info(f"任务 ID: {task_id}, 文件名: {file.filename}")
         
-        # 读取图片数据
-        image_data = file.read()
-        logger.info(f"图片大小: {len(image_data)} 字节")
-        
-        # 保存原图
+        # 上传内容读入内存，原图交给后台线程写盘（与下面的解码、分析并行）
         original_filename = secure_filename(file.filename) or f"image.{get_file_ext(file.filename)}"
         ext = get_file_ext(original_filename)
         original_path = os.path.join(ORIGINALS_FOLDER, f"{task_id}.{ext}")
-        with open(original_path, 'wb') as f:
-            f.write(image_data)
-        logger.info(f"原图已保存: {original_path}")
+        # 小文件 werkzeug 已经收在内存里（BytesIO），直接复用，不再复制一份；大文件从临时文件读入一次
+        if isinstance(file.stream, BytesIO):
+            buffer = file.stream
+        else:
+            buffer = BytesIO()
+            shutil.copyfileobj(file.stream, buffer)
+        # getvalue 在缓冲区未被导出时返回内部 bytes，写盘和解码共用同一份数据
+        image_data = buffer.getvalue()
+        logger.info(f"图片大小: {len(image_data)} 字节")
+        persist_future = _persist_executor.submit(persist_upload, task_id, original_path, image_data)
+        
+        # 解码一次，分析和后续转换共用这份解码结果
+        buffer.seek(0)
+        img = Image.open(buffer)
+        img.load()
         
         # 分析图片
         logger.info("正在分析图片...")
-        result = analyze_spritesheet(image_data)
+        result = analyze_spritesheet(img)
         logger.info(f"分析结果: {result['rows']}x{result['cols']}, 置信度: {result['confidence']:.2f}")
         
-        # 保存临时文件路径（用于后续转换）
-        temp_path = os.path.join(TEMP_FOLDER, f"{task_id}.tmp")
-        with open(temp_path, 'wb') as f:
-            f.write(image_data)
+        # 原图落盘后再保存元数据并返回，避免其他 worker 处理紧接着的转换请求时找不到文件；
+        # 写盘失败时异常在这里抛出，按分析失败返回 500
+        persist_future.result()
+        
+        # 缓存解码后的图片，转换时无需再次读盘解码
+        cache_decoded_image(task_id, img)
         
         # 保存元数据
         metadata = {
@@ -410,7 +694,7 @@ def analyze():
 
 @app.route('/api/convert', methods=['POST'])
 def convert():
-    """将精灵表转换为 GIF"""
+    """将精灵表转换为 GIF（提交后台任务，返回 202，结果通过 /api/status 查询）"""
     data = request.get_json()
     
     if not data:
@@ -425,27 +709,116 @@ def convert():
     if not all([task_id, rows, cols]):
         return jsonify({'error': '缺少必要参数'}), 400
     
-    temp_path = os.path.join(TEMP_FOLDER, f"{task_id}.tmp")
+    if not _TASK_ID_RE.match(str(task_id)):
+        return jsonify({'error': '无效的文件ID'}), 400
+    
+    # 参数在提交后台任务前校验，错误直接返回 400
+    rows, cols, margin, duration = (_int_param(v) for v in (rows, cols, margin, duration))
+    if None in (rows, cols, margin, duration):
+        return jsonify({'error': '参数必须是整数'}), 400
+    if not (1 <= rows <= MAX_GRID_SIZE and 1 <= cols <= MAX_GRID_SIZE
+            and margin >= 0 and 1 <= duration <= MAX_FRAME_DURATION):
+        return jsonify({'error': '参数超出范围'}), 400
     
-    if not os.path.exists(temp_path):
+    meta = load_meta(task_id)
+    if meta is None:
         return jsonify({'error': '文件已过期，请重新上传'}), 404
+    image_size = (meta.get('analysis') or {}).get('image_size')
+    if image_size and margin * 2 >= min(image_size[0] // cols, image_size[1] // rows):
+        return jsonify({'error': '边距过大或行列数超过图片尺寸'}), 400
+    
+    if not acquire_convert_marker(task_id):
+        return jsonify({'error': '该文件正在转换中，请稍候'}), 409
+    
+    try:
+        source = load_upload_image(task_id)
+        if source is None:
+            release_convert_marker(task_id)
+            return jsonify({'error': '文件已过期，请重新上传'}), 404
+        
+        update_meta(task_id, convert_status='queued', convert_error=None)
+        _convert_executor.submit(run_convert, task_id, source, rows, cols, margin, duration)
+    except Exception as e:
+        release_convert_marker(task_id)
+        logger.error(f"提交转换失败 {task_id}: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({'error': f'转换失败: {str(e)}'}), 500
+    
+    return jsonify({
+        'task_id': task_id,
+        'status': 'queued',
+        'status_url': f'/api/status/{task_id}'
+    }), 202
+
+
+def _int_param(value):
+    """把请求参数转为整数，不是整数（含布尔值和带小数的浮点数）时返回 None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _convert_marker_path(task_id):
+    return os.path.join(TEMP_FOLDER, f"{task_id}.converting")
+
+
+def convert_marker_active(task_id):
+    """转换中标记存在且未超时"""
+    try:
+        return time.time() - os.stat(_convert_marker_path(task_id)).st_mtime < CONVERT_MARKER_TIMEOUT
+    except FileNotFoundError:
+        return False
+
+
+def acquire_convert_marker(task_id):
+    """创建转换中标记，已有进行中的转换时返回 False（O_EXCL 保证多线程、多进程间只有一个成功）"""
+    path = _convert_marker_path(task_id)
+    for _ in range(2):
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(path).st_mtime < CONVERT_MARKER_TIMEOUT:
+                    return False
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    return False
+
+
+def release_convert_marker(task_id):
+    """删除转换中标记"""
+    try:
+        os.remove(_convert_marker_path(task_id))
+    except FileNotFoundError:
+        pass
+
+
+def run_convert(task_id, source, rows, cols, margin, duration):
+    """后台执行转换，进度和结果写入元数据的 convert_status 字段"""
+    update_meta(task_id, convert_status='running')
+    temp_path = os.path.join(TEMP_FOLDER, f"{task_id}.tmp")
     
     try:
         # 创建帧目录
         frames_dir = os.path.join(FRAMES_FOLDER, task_id)
         os.makedirs(frames_dir, exist_ok=True)
         
-        # 切片并保存帧文件
-        saved_frames = slice_spritesheet(temp_path, frames_dir, rows, cols, margin)
-        
-        # 从保存的帧生成 GIF
-        frames = slice_spritesheet_to_frames(temp_path, rows, cols, margin)
-        gif_data = create_gif_from_frames(frames, duration)
+        # 只切分一次，同一批帧既保存为帧文件也用于生成 GIF（用整张原图生成共享调色板）
+        frames = slice_spritesheet_to_frames(source, rows, cols, margin)
+        saved_frames = save_frames(frames, frames_dir)
+        gif_data = create_gif_stream(frames, duration, palette_source=source)
         
-        # 保存 GIF
+        # 保存 GIF，同时放入内存缓存供紧接着的预览/下载使用
         gif_path = os.path.join(GIFS_FOLDER, f"{task_id}.gif")
-        with open(gif_path, 'wb') as f:
-            f.write(gif_data)
+        write_atomic(gif_path, gif_data)
+        _cache_put(_gif_cache, GIF_CACHE_SIZE, task_id, (os.stat(gif_path).st_mtime_ns, gif_data))
         
         # 清理临时文件
         try:
@@ -454,105 +827,189 @@ def convert():
             pass
         
         # 更新元数据
-        meta_path = os.path.join(DATA_FOLDER, f"{task_id}_meta.json")
-        if os.path.exists(meta_path):
-            with open(meta_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-            metadata.update({
-                'frames_dir': frames_dir,
-                'frames_count': len(saved_frames),
-                'gif_path': gif_path,
-                'convert_time': datetime.now().isoformat(),
-                'params': {
-                    'rows': rows,
-                    'cols': cols,
-                    'margin': margin,
-                    'duration': duration
-                }
-            })
-            save_metadata(task_id, metadata)
-        
+        update_meta(
+            task_id,
+            convert_status='done',
+            frames_dir=frames_dir,
+            frames_count=len(saved_frames),
+            gif_path=gif_path,
+            convert_time=datetime.now().isoformat(),
+            params={
+                'rows': rows,
+                'cols': cols,
+                'margin': margin,
+                'duration': duration
+            }
+        )
+    
+    except Exception as e:
+        logger.error(f"转换失败 {task_id}: {e}")
+        update_meta(task_id, convert_status='failed', convert_error=f'转换失败: {str(e)}')
+    
+    finally:
+        release_convert_marker(task_id)
+
+
+@app.route('/api/status/<task_id>')
+def convert_status(task_id):
+    """查询转换任务状态：queued / running / done / failed"""
+    if not _TASK_ID_RE.match(task_id):
+        return jsonify({'error': '无效的文件ID'}), 400
+    
+    meta = load_meta(task_id, fresh=True)
+    if meta is None:
+        return jsonify({'error': '任务不存在或已过期'}), 404
+    
+    # 早于异步转换生成的元数据没有 convert_status，有 GIF 即视为已完成
+    status = meta.get('convert_status') or ('done' if meta.get('gif_path') else None)
+    if status is None:
+        return jsonify({'error': '该文件尚未提交转换'}), 404
+    
+    # 执行转换的 worker 异常退出时元数据会一直停在 queued/running，此时标记已不存在或已超时。
+    # run_convert 先写最终状态再删标记，所以标记失效后重新读一次元数据，避免把刚完成的任务误判为失败
+    if status in ('queued', 'running') and not convert_marker_active(task_id):
+        meta = load_meta(task_id, fresh=True) or meta
+        status = meta.get('convert_status')
+        if status in ('queued', 'running'):
+            return jsonify({'status': 'failed', 'error': '转换已中断，请重新提交'})
+    
+    if status == 'done':
         return jsonify({
+            'status': status,
             'success': True,
             'gif_id': task_id,
             'download_url': f'/api/download/{task_id}',
-            'frames_count': len(saved_frames)
+            'frames_count': meta.get('frames_count')
         })
-    
-    except Exception as e:
-        return jsonify({'error': f'转换失败: {str(e)}'}), 500
+    if status == 'failed':
+        return jsonify({'status': status, 'error': meta.get('convert_error') or '转换失败'})
+    return jsonify({'status': status})
 
 
 @app.route('/api/download/<task_id>')
 def download(task_id):
     """下载生成的 GIF"""
     # 安全检查
-    if not task_id.replace('-', '').replace('_', '').isalnum():
+    if not _TASK_ID_RE.match(task_id):
         return jsonify({'error': '无效的文件ID'}), 400
     
-    gif_path = os.path.join(GIFS_FOLDER, f"{task_id}.gif")
-    
-    if not os.path.exists(gif_path):
-        return jsonify({'error': '文件不存在或已过期'}), 404
-    
-    return send_file(
-        gif_path,
-        mimetype='image/gif',
-        as_attachment=True,
-        download_name='sprite_animation.gif'
-    )
+    return send_gif(task_id, as_attachment=True, download_name='sprite_animation.gif')
 
 
 @app.route('/api/preview/<task_id>')
 def preview(task_id):
     """预览生成的 GIF"""
-    if not task_id.replace('-', '').replace('_', '').isalnum():
+    if not _TASK_ID_RE.match(task_id):
         return jsonify({'error': '无效的文件ID'}), 400
     
-    gif_path = os.path.join(GIFS_FOLDER, f"{task_id}.gif")
+    return send_gif(task_id)
+
+
+def send_gif(task_id, **kwargs):
+    """
+    返回 GIF 响应，支持 ETag / If-None-Match 与 Range
+    
+    同一任务重新转换会覆盖同名 GIF，因此不设置 max_age，由浏览器每次用 ETag 重新验证，
+    内容未变时只返回 304。内存缓存只在磁盘文件 mtime 未变时使用（其他 worker 可能已重新转换）；
+    ETag 和 Last-Modified 都取自磁盘文件的 mtime 与大小，内存命中与读盘、不同 worker 之间保持一致。
+    启用 USE_X_ACCEL 时只返回响应头，文件内容、条件请求和 Range 都由 nginx 处理
+    """
+    if USE_X_ACCEL:
+        return x_accel_gif(task_id, **kwargs)
+    
+    try:
+        st = os.stat(os.path.join(GIFS_FOLDER, f"{task_id}.gif"))
+    except OSError:
+        return jsonify({'error': '文件不存在或已过期'}), 404
+    etag = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+    
+    cached = _cache_get(_gif_cache, task_id)
+    if cached is not None and cached[0] == st.st_mtime_ns:
+        return send_file(
+            BytesIO(cached[1]),
+            mimetype='image/gif',
+            etag=etag,
+            last_modified=st.st_mtime,
+            conditional=True,
+            **kwargs
+        )
     
-    if not os.path.exists(gif_path):
+    return send_from_directory(GIFS_FOLDER, f"{task_id}.gif", mimetype='image/gif', etag=etag,
+                               conditional=True, **kwargs)
+
+
+def x_accel_gif(task_id, as_attachment=False, download_name=None):
+    """返回带 X-Accel-Redirect 的空响应，由 nginx 从磁盘发送 GIF"""
+    filename = f"{task_id}.gif"
+    if not os.path.exists(os.path.join(GIFS_FOLDER, filename)):
         return jsonify({'error': '文件不存在或已过期'}), 404
     
-    return send_file(gif_path, mimetype='image/gif')
+    response = app.response_class(mimetype='image/gif')
+    response.headers['X-Accel-Redirect'] = X_ACCEL_GIFS_PREFIX + filename
+    if as_attachment:
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name or filename)
+    return response
+
+
+def _tree_size(path):
+    """递归统计目录下所有文件的总大小（scandir 一次返回类型信息，减少 stat 调用）"""
+    size = 0
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_file():
+                size += entry.stat().st_size
+            elif entry.is_dir(follow_symlinks=False):
+                size += _tree_size(entry.path)
+    return size
+
+
+def get_folder_stats(folder):
+    """统计目录下的条目数（文件和子目录）及总大小"""
+    if not os.path.exists(folder):
+        return {'count': 0, 'size': 0}
+    
+    count = 0
+    size = 0
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.is_file():
+                count += 1
+                size += entry.stat().st_size
+            elif entry.is_dir():
+                count += 1
+                size += _tree_size(entry.path)
+    return {'count': count, 'size': size}
+
+
+# 存储统计结果缓存 (计算时间, 结果)，STATS_CACHE_TTL 秒内重复请求直接返回
+STATS_CACHE_TTL = 5
+_stats_cache = (0.0, None)
 
 
 @app.route('/api/stats')
 def stats():
     """获取存储统计信息（管理用）"""
-    def get_folder_stats(folder):
-        if not os.path.exists(folder):
-            return {'count': 0, 'size': 0}
-        
-        count = 0
-        size = 0
-        for item in os.listdir(folder):
-            item_path = os.path.join(folder, item)
-            if os.path.isfile(item_path):
-                count += 1
-                size += os.path.getsize(item_path)
-            elif os.path.isdir(item_path):
-                count += 1
-                for root, dirs, files in os.walk(item_path):
-                    for f in files:
-                        size += os.path.getsize(os.path.join(root, f))
-        return {'count': count, 'size': size}
+    global _stats_cache
+    cached_at, result = _stats_cache
+    if result is None or time.time() - cached_at > STATS_CACHE_TTL:
+        result = {
+            'retention_days': FILE_RETENTION_DAYS,
+            'originals': get_folder_stats(ORIGINALS_FOLDER),
+            'frames': get_folder_stats(FRAMES_FOLDER),
+            'gifs': get_folder_stats(GIFS_FOLDER),
+            'temp': get_folder_stats(TEMP_FOLDER)
+        }
+        _stats_cache = (time.time(), result)
     
-    return jsonify({
-        'retention_days': FILE_RETENTION_DAYS,
-        'originals': get_folder_stats(ORIGINALS_FOLDER),
-        'frames': get_folder_stats(FRAMES_FOLDER),
-        'gifs': get_folder_stats(GIFS_FOLDER),
-        'temp': get_folder_stats(TEMP_FOLDER)
-    })
+    return jsonify(result)
 
 
 # ============================================
 # 启动
 # ============================================
 
-# 启动时清理旧文件
-cleanup_old_files()
+# 导入时即启动后台清理线程（gunicorn 等 WSGI 服务器不会执行 __main__），不阻塞 worker 启动
+start_cleanup_thread()
 
 
 if __name__ == '__main__':
@@ -571,9 +1028,6 @@ if __name__ == '__main__':
         for folder in [DATA_FOLDER, ORIGINALS_FOLDER, FRAMES_FOLDER, GIFS_FOLDER, TEMP_FOLDER]:
             os.makedirs(folder, exist_ok=True)
     
-    # 启动后台清理线程
-    start_cleanup_thread()
-    
     # 运行服务器
     print(f"\n🚀 服务已启动: http://localhost:{args.port}")
     print(f"📁 数据目录: {DATA_FOLDER}")
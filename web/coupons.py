@@ -7,7 +7,10 @@ from __future__ import annotations
 
 import os
 import re
+import queue
 import logging
+from contextlib import contextmanager
+from functools import lru_cache
 from datetime import datetime, timezone
 from typing import Dict
 
@@ -15,6 +18,12 @@ import pymysql
 
 logger = logging.getLogger(__name__)
 
+# 进程内连接池容量：空闲连接最多保留这么多个，超出的在归还时直接关闭
+POOL_SIZE = int(os.environ.get("MYSQL_POOL_SIZE", 8))
+_pool: "queue.LifoQueue" = queue.LifoQueue(maxsize=POOL_SIZE)
+
+_TABLE_RE = re.compile(r"[A-Za-z0-9_]+\Z")
+
 
 class CouponError(Exception):
     """券码校验或状态错误。"""
@@ -24,7 +33,9 @@ class CouponConfigError(CouponError):
     """数据库配置错误。"""
 
 
+@lru_cache(maxsize=1)
 def _db_config() -> Dict[str, str]:
+    """读取并校验数据库配置；环境变量在进程内不变，结果只计算一次（校验失败不会被缓存）。"""
     host = os.environ.get("MYSQL_HOST")
     user = os.environ.get("MYSQL_USER")
     password = os.environ.get("MYSQL_PASSWORD")
@@ -35,7 +46,7 @@ def _db_config() -> Dict[str, str]:
     if not all([host, user, password, database]):
         raise CouponConfigError("缺少 MYSQL_HOST/MYSQL_USER/MYSQL_PASSWORD/MYSQL_DB 环境变量")
 
-    if not re.match(r"^[A-Za-z0-9_]+$", table):
+    if not _TABLE_RE.match(table):
         raise CouponConfigError("券码表名仅支持字母、数字和下划线")
 
     return {
@@ -48,7 +59,7 @@ def _db_config() -> Dict[str, str]:
     }
 
 
-def _connect():
+def _new_connection():
     cfg = _db_config()
     return pymysql.connect(
         host=cfg["host"],
@@ -64,6 +75,38 @@ def _connect():
     )
 
 
+@contextmanager
+def _connect():
+    """从连接池借出一个连接，用完归还；池空时新建，省去每次请求的建连与认证开销。"""
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _new_connection()
+    else:
+        try:
+            # 空闲期间可能被服务端断开（wait_timeout），必要时自动重连
+            conn.ping(reconnect=True)
+        except pymysql.MySQLError:
+            conn.close()
+            conn = _new_connection()
+
+    broken = False
+    try:
+        yield conn
+    except pymysql.MySQLError:
+        # 数据库出错后连接状态不确定，不再放回池中；CouponError 等业务异常不影响连接复用
+        broken = True
+        raise
+    finally:
+        if broken:
+            conn.close()
+        else:
+            try:
+                _pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+
 def _table_name() -> str:
     return _db_config()["table"]
 
@@ -75,7 +118,8 @@ def _utc_now():
 def consume_coupon(code: str) -> Dict:
     """校验并消费一次券码使用次数。
 
-    返回券码行的关键字段，失败抛出 CouponError。
+    成功时只需一次 UPDATE（条件写在 WHERE 中，并借助 LAST_INSERT_ID 取回 id），
+    返回 {"id", "code", "last_used_at"}；失败时再查询一次以给出具体原因，抛出 CouponError。
     """
     code = (code or "").strip()
     if not code:
@@ -88,7 +132,26 @@ def consume_coupon(code: str) -> Dict:
         with conn.cursor() as cursor:
             cursor.execute(
                 f"""
-                SELECT id, code, status, usage_limit, usage_count, expires_at
+                UPDATE {table}
+                SET usage_count = usage_count + 1,
+                    last_used_at = %s,
+                    updated_at = %s,
+                    id = LAST_INSERT_ID(id)
+                WHERE code = %s
+                  AND status = 'active'
+                  AND usage_count < usage_limit
+                  AND (expires_at IS NULL OR expires_at > %s)
+                """,
+                (now, now, code, now),
+            )
+
+            if cursor.rowcount == 1:
+                return {"id": cursor.lastrowid, "code": code, "last_used_at": now}
+
+            # 未命中时查询一次，区分失败原因
+            cursor.execute(
+                f"""
+                SELECT status, usage_limit, usage_count, expires_at
                 FROM {table}
                 WHERE code=%s
                 """,
@@ -102,27 +165,7 @@ def consume_coupon(code: str) -> Dict:
                 raise CouponError("券码已停用")
             if row["expires_at"] and row["expires_at"] <= now:
                 raise CouponError("券码已过期")
-            if row["usage_count"] >= row["usage_limit"]:
-                raise CouponError("券码已用完")
-
-            cursor.execute(
-                f"""
-                UPDATE {table}
-                SET usage_count = usage_count + 1,
-                    last_used_at = %s,
-                    updated_at = %s
-                WHERE id = %s
-                  AND usage_count < usage_limit
-                """,
-                (now, now, row["id"]),
-            )
-
-            if cursor.rowcount == 0:
-                raise CouponError("券码已用完")
-
-            row["usage_count"] += 1
-            row["last_used_at"] = now
-            return row
+            raise CouponError("券码已用完")
 
 
 def refund_coupon_usage(coupon_id: int):
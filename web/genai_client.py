@@ -1,20 +1,28 @@
 """Gemini (ZenMux) 客户端封装，确保密钥从环境变量读取。"""
 from __future__ import annotations
 
-import json
 import os
 import logging
+import threading
+from functools import lru_cache
 from typing import Any, Optional
 
 from google import genai
 from google.genai import types
 
+from . import jsonutil
+
 logger = logging.getLogger(__name__)
 
 DEFAULT_MODEL = os.environ.get("ZENMUX_GEMINI_MODEL", "google/gemini-3-pro-image-preview")
 DEFAULT_BASE_URL = os.environ.get("ZENMUX_BASE_URL", "https://zenmux.ai/api/vertex-ai")
+_ENDPOINT_TEMPLATE = DEFAULT_BASE_URL.rstrip("/") + "/v1/models/{}:generateContent"
+
+_client: Optional[genai.Client] = None
+_client_lock = threading.Lock()
 
 
+@lru_cache(maxsize=1)
 def _build_http_options() -> object:
     """Return http_options for the GenAI client with graceful fallbacks."""
     options = {"api_version": "v1", "base_url": DEFAULT_BASE_URL}
@@ -30,12 +38,14 @@ def _build_http_options() -> object:
         return options
 
 
+@lru_cache(maxsize=1)
 def _get_api_key() -> str:
+    """读取 ZENMUX_API_KEY，每个进程只读取一次；缺失时抛错且不缓存。"""
     api_key = os.environ.get("ZENMUX_API_KEY")
     if not api_key:
         logger.error("未检测到 ZENMUX_API_KEY 环境变量")
         raise RuntimeError("未检测到 ZENMUX_API_KEY 环境变量，无法调用 Gemini 服务。")
-    logger.info(f"API Key 已加载 (长度: {len(api_key)} 字符)")
+    logger.debug("API Key 已加载 (长度: %d 字符)", len(api_key))
     return api_key
 
 
@@ -52,7 +62,18 @@ def _config_to_dict(config: Any) -> Any:
     return str(config)
 
 
+def _contents_to_json(contents: Any) -> Any:
+    """把 types.Content / types.Part 等 SDK 对象转换为请求体中的 JSON 结构（字节按 base64 输出）。"""
+    if isinstance(contents, (list, tuple)):
+        return [_contents_to_json(item) for item in contents]
+    if hasattr(contents, "model_dump"):
+        return contents.model_dump(mode="json", exclude_none=True)
+    return contents
+
+
+@lru_cache(maxsize=1)
 def _api_key_preview() -> str:
+    """脱敏后的密钥预览，只用于日志；环境变量在进程内不变，只计算一次。"""
     api_key = os.environ.get("ZENMUX_API_KEY", "")
     if not api_key:
         return "<MISSING>"
@@ -70,16 +91,16 @@ def build_curl_preview(
     safety_settings: Any = None,
 ) -> str:
     """构造一条可读的 curl 预览，便于和服务端抓包对比。"""
-    endpoint = f"{DEFAULT_BASE_URL.rstrip('/')}/v1/models/{model}:generateContent"
+    endpoint = _ENDPOINT_TEMPLATE.format(model)
 
-    body: dict[str, Any] = {"contents": contents}
+    body: dict[str, Any] = {"contents": _contents_to_json(contents)}
     config_dict = _config_to_dict(config)
     if config_dict:
         body[config_key] = config_dict
     if safety_settings:
         body["safety_settings"] = safety_settings
 
-    body_json = json.dumps(body, ensure_ascii=False)
+    body_json = jsonutil.dumps(body).decode("utf-8")
     return (
         "curl --location "
         f"'{endpoint}' \\\n"
@@ -93,8 +114,21 @@ def create_gemini_client() -> genai.Client:
     """使用 ZenMux 代理创建 Gemini 客户端。
 
     - 读取 `ZENMUX_API_KEY`，避免在代码中硬编码密钥；
-    - 支持通过 `ZENMUX_BASE_URL` 和 `ZENMUX_GEMINI_MODEL` 覆盖默认配置。
+    - 支持通过 `ZENMUX_BASE_URL` 和 `ZENMUX_GEMINI_MODEL` 覆盖默认配置；
+    - 每个进程只创建一次并复用（Client 可跨线程共享，复用其 HTTP 连接池），
+      并发的首次调用由锁保证只创建一个；创建失败时不缓存，下次调用会重试。
     """
+    global _client
+    client = _client
+    if client is None:
+        with _client_lock:
+            client = _client
+            if client is None:
+                client = _client = _build_client()
+    return client
+
+
+def _build_client() -> genai.Client:
     logger.info(f"创建 Gemini 客户端，Base URL: {DEFAULT_BASE_URL}")
     logger.info("google-genai 版本: %s", getattr(genai, "__version__", "unknown"))
     api_key = _get_api_key()
@@ -159,6 +193,12 @@ def create_gemini_client() -> genai.Client:
         raise
 
 
+@lru_cache(maxsize=16)
+def _gen_config(temperature: float) -> Any:
+    """按温度缓存 GenerationConfig，取值通常只有界面上的少数几档；调用方不应修改返回的对象。"""
+    return types.GenerationConfig(temperature=temperature)
+
+
 def generate_text(
     prompt: str,
     *,
@@ -174,9 +214,7 @@ def generate_text(
     """
 
     client = create_gemini_client()
-    generation_config = None
-    if temperature is not None:
-        generation_config = types.GenerationConfig(temperature=temperature)
+    generation_config = _gen_config(temperature) if temperature is not None else None
 
     prompt_preview = prompt if len(prompt) <= 1000 else f"{prompt[:1000]}... (total {len(prompt)} chars)"
     logger.info(
@@ -188,13 +226,15 @@ def generate_text(
     if generation_config:
         logger.info("使用 generation_config: %s", generation_config)
 
-    curl_preview = build_curl_preview(
-        model=model or DEFAULT_MODEL,
-        contents=prompt,
-        config=generation_config,
-        config_key="generation_config",
-    )
-    logger.info("Curl 请求预览:\n%s", curl_preview)
+    # 日志级别高于 INFO 时不必拼装 curl 预览
+    if logger.isEnabledFor(logging.INFO):
+        curl_preview = build_curl_preview(
+            model=model or DEFAULT_MODEL,
+            contents=prompt,
+            config=generation_config,
+            config_key="generation_config",
+        )
+        logger.info("Curl 请求预览:\n%s", curl_preview)
 
     response = client.models.generate_content(
         model=model or DEFAULT_MODEL,
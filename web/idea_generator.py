@@ -2,10 +2,10 @@
 
 from __future__ import annotations
 
-import json
 import re
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Optional
 
+from . import jsonutil
 from .genai_client import DEFAULT_MODEL, generate_text
 
 PLAN_PROMPT_TEMPLATE = """
@@ -25,25 +25,24 @@ PLAN_PROMPT_TEMPLATE = """
 如果提供了风格偏好：{style_hint}
 """
 
+_JSON_OBJ_RE = re.compile(r"\{[\s\S]*\}")
+
 
 def _extract_json_block(text: str) -> Dict[str, Any]:
     """从模型输出中提取 JSON。"""
 
-    candidates: List[str] = []
     try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        candidates.append(text)
+        return jsonutil.loads(text)
+    except jsonutil.JSONDecodeError:
+        pass
 
-    match = re.search(r"\{[\s\S]*\}", text)
+    # 常见情况是 JSON 被包在代码块或说明文字里，截取最外层花括号再解析一次
+    match = _JSON_OBJ_RE.search(text)
     if match:
-        candidates.append(match.group(0))
-
-    for item in candidates:
         try:
-            return json.loads(item)
-        except json.JSONDecodeError:
-            continue
+            return jsonutil.loads(match.group(0))
+        except jsonutil.JSONDecodeError:
+            pass
 
     raise ValueError("未能从模型输出中解析出 JSON 计划，请调整提示词后重试。")
 
@@ -0,0 +1,32 @@
+"""JSON 编解码：安装了 orjson 时使用它，否则回退到标准库 json。"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，两种实现都可以统一捕获它
+JSONDecodeError = json.JSONDecodeError
+
+
+def dumps(obj: Any, *, indent: bool = False) -> bytes:
+    """序列化为 UTF-8 字节串（非 ASCII 字符原样输出），indent=True 时按两个空格缩进。"""
+    if HAS_ORJSON:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    """解析 str / bytes 形式的 JSON。"""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
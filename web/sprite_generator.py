@@ -1,13 +1,21 @@
 """使用 Gemini 生成精灵表图片的服务。"""
 from __future__ import annotations
 
-import base64
+import binascii
 import os
 import logging
 from io import BytesIO
-from typing import Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from PIL import Image
+from google.genai import types
+import PIL
+from PIL import Image, features
+
+try:
+    import pybase64
+    HAS_PYBASE64 = True
+except ImportError:
+    HAS_PYBASE64 = False
 
 from .genai_client import create_gemini_client, DEFAULT_MODEL, build_curl_preview
 
@@ -17,11 +25,114 @@ logger = logging.getLogger(__name__)
 # 使用 google/gemini-3-pro-image-preview，它支持多模态输出包括图片
 IMAGE_GEN_MODEL = os.environ.get("ZENMUX_IMAGE_MODEL", "google/gemini-3-pro-image-preview")
 
+# 默认生成配置在模块加载时构造一次，各请求共享（调用方不应修改它）
+IMAGE_RESPONSE_MODALITIES = ["image", "text"]
+DEFAULT_TEMPERATURE = 0.8
+_DEFAULT_CONFIG = types.GenerateContentConfig(
+    response_modalities=IMAGE_RESPONSE_MODALITIES,
+    temperature=DEFAULT_TEMPERATURE,
+)
+
+
+def _detect_fast_png_codec() -> Optional[str]:
+    """PNG 重新编码主要耗时在 deflate：Pillow 11+ 官方 wheel 自带 zlib-ng，pillow-simd 的版本号带 .post。"""
+    if "zlib_ng" in features.features and features.check_feature("zlib_ng"):
+        return f"zlib-ng {features.version('zlib_ng')}"
+    if ".post" in PIL.__version__:
+        return f"pillow-simd {PIL.__version__}"
+    return None
+
+
+FAST_PNG_CODEC = _detect_fast_png_codec()
+# 旧版 Pillow 仍在支持范围内，只在 debug 日志中提示，升级建议见部署文档
+logger.debug("PNG 编码加速: %s", FAST_PNG_CODEC or f"无（Pillow {PIL.__version__} 使用普通 zlib）")
+
+
+# 常见图片格式的文件头：前 4 字节按大端整数查表，JPEG 只比较 3 字节、BMP 只比较 2 字节，
+# 查不到时依次用掩码去掉末尾字节再查；RIFF 还需确认第 8-12 字节是 WEBP
+_MAGIC_MIME = {
+    0x89504E47: 'image/png',    # \x89PNG
+    0x47494638: 'image/gif',    # GIF8（GIF87a / GIF89a）
+    0x52494646: 'image/webp',   # RIFF
+    0xFFD8FF00: 'image/jpeg',   # \xff\xd8\xff
+    0x424D0000: 'image/bmp',    # BM
+}
+
+
+def _sniff_mime(data: bytes) -> Optional[str]:
+    """根据文件头判断图片 MIME 类型，无需 Pillow 解析；识别不了时返回 None。"""
+    if len(data) < 4:
+        return None
+    sig = int.from_bytes(data[:4], 'big')
+    mime_type = (
+        _MAGIC_MIME.get(sig)
+        or _MAGIC_MIME.get(sig & 0xFFFFFF00)
+        or _MAGIC_MIME.get(sig & 0xFFFF0000)
+    )
+    if mime_type == 'image/webp' and data[8:12] != b'WEBP':
+        return None
+    return mime_type
+
+
+# PNG IHDR 中的颜色类型：2=RGB，3=调色板，6=RGBA，这几种不需要转换模式
+_PNG_PASSTHROUGH_COLOR_TYPES = (2, 3, 6)
+
+
+def _is_passthrough_png(data: Union[bytes, bytearray, memoryview]) -> bool:
+    """是否为可原样保存的 PNG（颜色类型位于文件头第 25 字节的 IHDR 中）。"""
+    head = bytes(data[:26])
+    return (
+        len(head) == 26
+        and head.startswith(b'\x89PNG\r\n\x1a\n')
+        and head[12:16] == b'IHDR'
+        and head[25] in _PNG_PASSTHROUGH_COLOR_TYPES
+    )
+
+
+def _plausible_base64_length(data: str) -> bool:
+    """解码前检查长度：标准 base64 长度是 4 的倍数，此时直接通过；否则再扫描一遍是否带换行（分行编码长度不定，交给解码器处理）。"""
+    n = len(data)
+    if n == 0:
+        return False
+    return n % 4 == 0 or '\n' in data
+
+
+def _b64decode(data: str) -> bytes:
+    """base64 解码；安装了 pybase64 时使用其 SIMD 实现，否则直接调用 binascii（跳过 base64 模块的包装）。"""
+    if HAS_PYBASE64:
+        return pybase64.b64decode(data, validate=False)
+    return binascii.a2b_base64(data)
+
+
+def _build_preview(contents: List[types.Content]) -> List[Dict[str, Any]]:
+    """生成请求内容的日志摘要：文本截断到 200 字符，图片只记录类型和字节数。"""
+    contents_preview: List[Dict[str, Any]] = []
+    for entry in contents:
+        parts_preview: List[Dict[str, Any]] = []
+        for part in entry.parts or []:
+            if part.text is not None:
+                text = part.text
+                preview = text if len(text) <= 200 else f"{text[:200]}... (total {len(text)} chars)"
+                parts_preview.append({"text_preview": preview, "text_length": len(text)})
+            elif part.inline_data is not None:
+                data = part.inline_data.data
+                parts_preview.append(
+                    {
+                        "inline_data": {
+                            "mime_type": part.inline_data.mime_type,
+                            "data_length": len(data) if data is not None else "unknown",
+                        }
+                    }
+                )
+        contents_preview.append({"role": entry.role, "parts": parts_preview})
+    return contents_preview
+
 
 def generate_spritesheet(
     prompt: str,
     reference_image: Optional[bytes] = None,
     model: Optional[str] = None,
+    temperature: Optional[float] = None,
 ) -> Tuple[bytes, str]:
     """调用 Gemini 生成精灵表图片。
 
@@ -29,156 +140,159 @@ def generate_spritesheet(
         prompt: 生成提示词
         reference_image: 可选的参考图片（bytes 格式）
         model: 覆盖默认模型名称
+        temperature: 可选，覆盖默认的生成随机度（0.8）
 
     返回:
         (image_bytes, mime_type) 元组
     """
     logger.info("开始创建 Gemini 客户端...")
     client = create_gemini_client()
+    use_model, contents, config = _prepare_request(prompt, reference_image, model, temperature)
+
+    # 调用模型生成
+    logger.info("正在调用 Gemini API...")
+    try:
+        response = client.models.generate_content(
+            model=use_model,
+            contents=contents,
+            config=config,
+        )
+        logger.info("Gemini API 调用成功")
+    except Exception as e:
+        logger.error(f"Gemini API 调用失败: {str(e)}")
+        raise
+
+    return _extract_image(response)
+
+
+def _prepare_request(
+    prompt: str,
+    reference_image: Optional[bytes],
+    model: Optional[str],
+    temperature: Optional[float],
+) -> Tuple[str, List[types.Content], types.GenerateContentConfig]:
+    """构造 (模型名, contents, config)，并按日志级别输出请求预览。"""
     use_model = model or IMAGE_GEN_MODEL
     logger.info(f"使用模型: {use_model}")
 
     # 构建请求内容
-    contents = []
+    parts: List[types.Part] = []
     
     if reference_image:
         logger.info("检测到参考图，正在处理...")
         # 如果有参考图，先添加参考图
-        # 检测图片格式
-        img = Image.open(BytesIO(reference_image))
-        mime_type = f"image/{img.format.lower()}" if img.format else "image/png"
-        logger.info(f"参考图格式: {mime_type}, 尺寸: {img.size}")
-        
-        # 将图片转为 base64
-        img_base64 = base64.b64encode(reference_image).decode('utf-8')
+        # 检测图片格式：常见格式直接看文件头，识别不了再交给 Pillow
+        mime_type = _sniff_mime(reference_image)
+        if mime_type is None or logger.isEnabledFor(logging.DEBUG):
+            # 只读取文件头，不解码像素；with 结束即释放
+            with Image.open(BytesIO(reference_image)) as img:
+                if mime_type is None:
+                    mime_type = f"image/{img.format.lower()}" if img.format else "image/png"
+                logger.debug(f"参考图尺寸: {img.size}")
+        logger.info(f"参考图格式: {mime_type}, 大小: {len(reference_image)} 字节")
         
-        contents.append({
-            "role": "user",
-            "parts": [
-                {
-                    "inline_data": {
-                        "mime_type": mime_type,
-                        "data": img_base64
-                    }
-                },
-                {"text": prompt}
-            ]
-        })
+        # 直接传原始字节，由 SDK 在序列化请求时编码一次，不再预先转成 base64 字符串
+        parts.append(types.Part(inline_data=types.Blob(mime_type=mime_type, data=reference_image)))
     else:
         logger.info("无参考图，仅使用文本提示词")
-        contents.append({
-            "role": "user",
-            "parts": [{"text": prompt}]
-        })
-
-    # 配置生成参数
-    from google.genai import types
-    config = types.GenerateContentConfig(
-        response_modalities=["image", "text"],
-        temperature=0.8,
-    )
-    logger.info("生成配置: response_modalities=['image', 'text'], temperature=0.8")
-
-    contents_preview = []
-    for entry in contents:
-        parts_preview = []
-        for part in entry.get("parts", []):
-            if "text" in part:
-                text = part["text"]
-                preview = text if len(text) <= 200 else f"{text[:200]}... (total {len(text)} chars)"
-                parts_preview.append({"text_preview": preview, "text_length": len(text)})
-            elif "inline_data" in part:
-                inline_data = part["inline_data"]
-                data = inline_data.get("data", "")
-                parts_preview.append(
-                    {
-                        "inline_data": {
-                            "mime_type": inline_data.get("mime_type"),
-                            "data_length": len(data) if hasattr(data, "__len__") else "unknown",
-                        }
-                    }
-                )
-        contents_preview.append({"role": entry.get("role"), "parts": parts_preview})
-
-    logger.info("Gemini 请求内容: model=%s, contents_preview=%s, config=%s", use_model, contents_preview, config)
+    parts.append(types.Part(text=prompt))
+    contents = [types.Content(role="user", parts=parts)]
 
-    curl_preview = build_curl_preview(
-        model=use_model,
-        contents=contents,
-        config=config,
-        config_key="config",
-    )
-    logger.info("Curl 请求预览:\n%s", curl_preview)
+    # 配置生成参数：默认温度直接复用模块级配置
+    if temperature is None or temperature == DEFAULT_TEMPERATURE:
+        config = _DEFAULT_CONFIG
+    else:
+        config = types.GenerateContentConfig(
+            response_modalities=IMAGE_RESPONSE_MODALITIES,
+            temperature=temperature,
+        )
+    logger.info("生成配置: response_modalities=%s, temperature=%s", IMAGE_RESPONSE_MODALITIES, config.temperature)
 
-    # 调用模型生成
-    logger.info("正在调用 Gemini API...")
-    try:
-        response = client.models.generate_content(
+    # 日志级别高于 INFO 时不构造内容预览和 curl 预览
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Gemini 请求内容: model=%s, contents_preview=%s, config=%s", use_model, _build_preview(contents), config)
+        curl_preview = build_curl_preview(
             model=use_model,
             contents=contents,
             config=config,
+            config_key="config",
         )
-        logger.info("Gemini API 调用成功")
-    except Exception as e:
-        logger.error(f"Gemini API 调用失败: {str(e)}")
-        raise
+        logger.info("Curl 请求预览:\n%s", curl_preview)
+
+    return use_model, contents, config
 
+
+def _extract_image(response: types.GenerateContentResponse) -> Tuple[bytes, str]:
+    """从响应中取出第一张图片，返回 (image_bytes, mime_type)。"""
     # 检查响应
     if not response.candidates:
         logger.error("Gemini 返回空的 candidates")
         raise ValueError("模型未返回有效响应")
     
-    logger.info(f"响应包含 {len(response.candidates)} 个 candidate")
+    logger.debug("响应包含 %d 个 candidate", len(response.candidates))
     
-    # 从响应中提取图片
-    for i, part in enumerate(response.candidates[0].content.parts):
-        logger.info(f"检查 part {i}: type={type(part).__name__}")
-        if hasattr(part, 'inline_data') and part.inline_data:
-            image_data = part.inline_data.data
-            mime_type = part.inline_data.mime_type or "image/png"
-            logger.info(f"找到图片数据，类型: {mime_type}")
-            
-            # 解码 base64 图片数据
-            if isinstance(image_data, str):
-                logger.info("图片数据是 base64 字符串，正在解码...")
-                image_bytes = base64.b64decode(image_data)
-            else:
-                logger.info("图片数据是字节流")
-                image_bytes = image_data
-            
-            logger.info(f"图片解码成功，大小: {len(image_bytes)} 字节")
-            return image_bytes, mime_type
-        elif hasattr(part, 'text') and part.text:
-            logger.info(f"part {i} 是文本: {part.text[:100]}...")
-
-    logger.error("响应中未找到图片数据")
-    raise ValueError("模型未返回图片，请检查提示词或重试。")
-
-
-def save_generated_image(image_bytes: bytes, output_path: str) -> str:
+    # 取第一个带图片数据的 part
+    parts = response.candidates[0].content.parts or []
+    image_part = next(
+        (part for part in parts if getattr(part, 'inline_data', None) and part.inline_data.data),
+        None,
+    )
+    if image_part is None:
+        # 没有图片时把模型返回的文本记下来，便于排查
+        for part in parts:
+            if getattr(part, 'text', None):
+                logger.info("模型返回文本: %s...", part.text[:100])
+        logger.error("响应中未找到图片数据")
+        raise ValueError("模型未返回图片，请检查提示词或重试。")
+
+    image_data = image_part.inline_data.data
+    mime_type = image_part.inline_data.mime_type or "image/png"
+
+    # SDK 通常已返回解码后的字节，只有字符串时才需要 base64 解码
+    if isinstance(image_data, bytes):
+        image_bytes = image_data
+    elif isinstance(image_data, str):
+        logger.info("图片数据是 base64 字符串，正在解码...")
+        if not _plausible_base64_length(image_data):
+            logger.error("图片 base64 数据长度异常: %d", len(image_data))
+            raise ValueError("模型返回的图片数据格式错误，请重试。")
+        image_bytes = _b64decode(image_data)
+    else:
+        image_bytes = bytes(image_data)
+
+    logger.info("找到图片数据，类型: %s，大小: %d 字节", mime_type, len(image_bytes))
+    return image_bytes, mime_type
+
+
+def save_generated_image(image_bytes: Union[bytes, bytearray, memoryview], output_path: str,
+                         compress_level: int = 1) -> str:
     """保存生成的图片到文件。
 
     参数:
-        image_bytes: 图片字节数据
+        image_bytes: 图片字节数据（任何支持缓冲区协议的对象，原样写入时不会复制）
         output_path: 输出路径
+        compress_level: 需要重新编码时的 PNG 压缩级别（0-9），默认 1 以速度优先，
+                        需要更小文件时传 6
 
     返回:
         保存的文件路径
     """
     # 确保目录存在
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    # 使用 PIL 处理图片，确保格式正确
-    img = Image.open(BytesIO(image_bytes))
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
     
-    # 转换为 RGB（如果需要）
-    if img.mode in ('RGBA', 'P'):
-        # 保持透明度或转换
-        pass
-    elif img.mode != 'RGB':
-        img = img.convert('RGB')
+    # 已经是 RGB/RGBA/调色板 PNG 时解码再编码得到的仍是同样的图，直接写入原始字节
+    if _is_passthrough_png(image_bytes) and output_path.lower().endswith('.png'):
+        with open(output_path, 'wb') as f:
+            f.write(image_bytes)
+        return output_path
     
-    # 保存图片
-    img.save(output_path, format='PNG')
+    # 使用 PIL 处理图片，确保格式正确
+    # with 块结束时立即释放解码器和缓冲，连续处理多张图时峰值内存更低
+    with Image.open(BytesIO(image_bytes)) as img:
+        # 转换为 RGB（如果需要），RGBA / P 保持透明度
+        out = img if img.mode in ('RGB', 'RGBA', 'P') else img.convert('RGB')
+        
+        # 保存图片
+        out.save(output_path, format='PNG', compress_level=compress_level, optimize=False)
     
     return output_path
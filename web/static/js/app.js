@@ -2,6 +2,9 @@
  * 精灵表转 GIF - 前端交互逻辑
  */
 
+// 等待后台转换完成的最长时间（毫秒）
+const CONVERT_TIMEOUT_MS = 3 * 60 * 1000;
+
 // 预设模板数据
 const TEMPLATES = {
     'weapon-attack': {
@@ -854,7 +857,12 @@ class SpriteToGif {
                 body: JSON.stringify(params)
             });
             
-            const data = await response.json();
+            let data = await response.json();
+            
+            // 转换在后台执行，轮询状态直到完成或失败
+            if (response.status === 202) {
+                data = await this.waitForConvert(data.status_url);
+            }
             
             if (data.success) {
                 this.showResult(data);
@@ -870,6 +878,22 @@ class SpriteToGif {
         }
     }
 
+    async waitForConvert(statusUrl) {
+        const deadline = Date.now() + CONVERT_TIMEOUT_MS;
+        let delay = 300;
+        while (Date.now() < deadline) {
+            await new Promise(resolve => setTimeout(resolve, delay));
+            delay = Math.min(delay * 1.5, 2000);
+            
+            const response = await fetch(statusUrl);
+            const data = await response.json();
+            if (!response.ok || data.status === 'done' || data.status === 'failed') {
+                return data;
+            }
+        }
+        return { status: 'failed', error: '转换超时，请稍后重试' };
+    }
+
     showResult(data) {
         const previewUrl = `/api/preview/${data.gif_id}`;
         this.currentGifId = data.gif_id;